@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+batch_convert.py
+
+Batch/directory mode shared by `image_to_codes.py` and `codes_to_image.py`.
+Inputs (files, directories or glob patterns) are expanded, converted on a
+process pool, reported as each file finishes and summarised in a JSON
+manifest with per-file timings and errors.
+
+Batch mode never opens a file dialog or prompts, so it is safe for
+unattended runs. Outputs keep each input's directory relative to the
+inputs' common directory, so same-named files from different directories
+do not overwrite each other.
+
+Usage:
+  py -3 image_to_codes.py --batch sprites/ "more/*.png" --size 32 --workers 4
+  py -3 codes_to_image.py --batch "codes/*.json" --output-dir renders/
+"""
+import glob
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+IMAGE_EXTS = ('.png', '.jpg', '.jpeg', '.gif', '.bmp')
+JSON_EXTS = ('.json', '.ndjson')
+MANIFEST_NAME = 'batch_manifest.json'
+
+
+def expand_inputs(patterns, exts):
+    """Expand files, directories and glob patterns into a list of file paths.
+
+    Directories are scanned (non-recursively) for files with one of `exts`,
+    skipping an earlier run's manifest; globs support `**`. Order is
+    preserved and duplicates are dropped.
+    """
+    paths = []
+    seen = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            found = sorted(
+                os.path.join(pattern, name) for name in os.listdir(pattern)
+                if name.lower().endswith(exts) and name != MANIFEST_NAME
+            )
+        elif os.path.isfile(pattern):
+            found = [pattern]
+        else:
+            found = sorted(p for p in glob.glob(pattern, recursive=True) if os.path.isfile(p))
+        for p in found:
+            key = os.path.normcase(os.path.abspath(p))
+            if key not in seen:
+                seen.add(key)
+                paths.append(p)
+    return paths
+
+
+def _default_name(kind, path, options):
+    if kind == 'image_to_codes':
+        from image_to_codes import default_output_path
+        return default_output_path(path, options.get('size', 32))
+    from codes_to_image import default_output_path
+    return default_output_path(path)
+
+
+def plan_outputs(kind, paths, output_dir=None, **options):
+    """Output path for each input path.
+
+    Inputs keep their directory relative to the directory all inputs share,
+    under `output_dir` (default: the current directory), so `a/x.png` and
+    `b/x.png` do not write the same file. Inputs whose output would still
+    clash with an earlier one (e.g. `x.png` and `x.gif`) map to None.
+    """
+    dirs = [os.path.dirname(os.path.abspath(p)) for p in paths]
+    try:
+        common = os.path.commonpath(dirs) if dirs else ''
+    except ValueError:
+        # inputs on different drives: keep the flat layout
+        common = None
+    outputs = {}
+    taken = set()
+    for path, d in zip(paths, dirs):
+        rel = os.path.relpath(d, common) if common is not None else '.'
+        out_dir = output_dir or ''
+        if rel != '.':
+            out_dir = os.path.join(out_dir, rel)
+        output_path = os.path.join(out_dir, _default_name(kind, path, options))
+        key = os.path.normcase(os.path.abspath(output_path))
+        outputs[path] = None if key in taken else output_path
+        taken.add(key)
+    return outputs
+
+
+def _convert_one(kind, path, output_path, options):
+    """Worker: convert a single file. Runs in a pool process."""
+    start = time.perf_counter()
+    result = {'input': path, 'output': None, 'seconds': None, 'error': None}
+    try:
+        if os.path.dirname(output_path):
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        if kind == 'image_to_codes':
+            from image_to_codes import image_to_codes
+            store = None
+            if options.get('store'):
+                from codes_store import CodesStore
+                store = CodesStore(options['store'], defer_refs=True)
+            result['output'] = image_to_codes(path, size=options.get('size', 32), output_path=output_path,
+                                              resize=options.get('resize', True), rle=options.get('rle', False),
+                                              palette=options.get('palette', False),
+                                              frames=options.get('frames', True), store=store,
+                                              colors=options.get('colors'),
+                                              quantize=options.get('quantize', 'median'),
+                                              fixed_palette=options.get('fixed_palette'),
+                                              palette_cache=options.get('palette_cache'))
+            if store is not None:
+                result['refs'] = store.pending_refs
+        elif kind == 'codes_to_image':
+            from codes_to_image import codes_json_to_image
+            cache = None
+            if options.get('cache_dir'):
+                from decode_cache import CACHE_MAX_BYTES, DecodeCache
+                cache = DecodeCache(options['cache_dir'], options.get('cache_max_bytes') or CACHE_MAX_BYTES)
+            result['output'] = codes_json_to_image(path, output_path, cache)
+            if cache is not None:
+                result['cache'] = 'hit' if cache.stats['hits'] else 'miss'
+        else:
+            raise ValueError(f'Unknown batch kind: {kind}')
+    except Exception as e:
+        result['error'] = f'{type(e).__name__}: {e}'
+    result['seconds'] = round(time.perf_counter() - start, 6)
+    return result
+
+
+def iter_batch(kind, paths, output_dir=None, workers=None, **options):
+    """Convert `paths` and yield one result dict per file as each finishes.
+
+    Files whose output path clashes with an earlier file's (see
+    `plan_outputs`) are not converted and come back with an error.
+    """
+    if kind not in ('image_to_codes', 'codes_to_image'):
+        raise ValueError(f'Unknown batch kind: {kind}')
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    outputs = plan_outputs(kind, paths, output_dir, **options)
+    todo = []
+    for path in paths:
+        if outputs[path] is None:
+            yield {'input': path, 'output': None, 'seconds': 0.0,
+                   'error': 'Output name clashes with an earlier input; rename the file or convert it separately'}
+        else:
+            todo.append(path)
+    if workers <= 1 or len(todo) <= 1:
+        for path in todo:
+            yield _convert_one(kind, path, outputs[path], options)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_convert_one, kind, path, outputs[path], options) for path in todo]
+        for fut in as_completed(futures):
+            yield fut.result()
+
+
+def run_batch(kind, patterns, output_dir=None, workers=None, manifest_path=None, **options):
+    """Expand `patterns`, convert every file and write a summary manifest.
+
+    Prints one line per file as it completes. Returns the manifest dict.
+    """
+    exts = IMAGE_EXTS if kind == 'image_to_codes' else JSON_EXTS
+    paths = expand_inputs(patterns, exts)
+    if not manifest_path:
+        manifest_path = os.path.join(output_dir or '.', MANIFEST_NAME)
+
+    start = time.perf_counter()
+    files = []
+    for i, result in enumerate(iter_batch(kind, paths, output_dir, workers, **options), 1):
+        files.append(result)
+        status = f"-> {result['output']}" if result['error'] is None else f"ERROR {result['error']}"
+        print(f"[{i}/{len(paths)}] {result['input']} {status} ({result['seconds']:.3f}s)")
+
+    order = {path: i for i, path in enumerate(paths)}
+    if options.get('store'):
+        # workers only collect their refs; write them here in one go
+        from codes_store import CodesStore
+        refs = {}
+        for result in sorted(files, key=lambda r: order[r['input']]):
+            refs.update(result.pop('refs', None) or {})
+        CodesStore(options['store']).update_refs(refs)
+    failed = sum(1 for r in files if r['error'] is not None)
+    manifest = {
+        'kind': kind,
+        'workers': workers or os.cpu_count() or 1,
+        'options': options,
+        'count': len(files),
+        'succeeded': len(files) - failed,
+        'failed': failed,
+        'seconds': round(time.perf_counter() - start, 6),
+        'files': sorted(files, key=lambda r: order[r['input']]),
+    }
+    if options.get('cache_dir'):
+        manifest['cache'] = {'hits': sum(1 for r in files if r.get('cache') == 'hit'),
+                             'misses': sum(1 for r in files if r.get('cache') == 'miss')}
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    print(f"Converted {manifest['succeeded']}/{len(files)} files; manifest: {manifest_path}")
+    if 'cache' in manifest:
+        print(f"Cache: {manifest['cache']['hits']} hits, {manifest['cache']['misses']} misses")
+    return manifest
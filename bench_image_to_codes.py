@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+bench_image_to_codes.py
+
+Compare the buffer-based row encoder in `image_to_codes.py` against the
+original per-pixel `getpixel` loop on synthetic RGBA images.
+
+Sizes above 32 use the multi-letter labels from `pixel_codes.row_labels`.
+
+With --pipeline (implied by --stages, --save and --compare) the pipeline
+stages are benchmarked instead:
+
+  encode    image_to_codes.image_to_codes        PNG -> pixel-code JSON
+  decode    codes_to_image.codes_json_to_image   pixel-code JSON -> PNG
+  extract   extract_codes.extract                pixel-code JSON -> extracted JSON
+  generate  generate_codes_json.build_codes_map  rows -> codes.json
+
+Each stage is timed separately (best of --repeat runs) and reported as
+seconds, pixels per second and peak Python memory (tracemalloc, measured
+in a separate run so it does not skew the timing; Pillow's C buffers are
+not counted). `generate` only reads the first 32 rows (the ROW_* keys), so
+its pixel rate counts the pixels of those rows, not the whole image. Sizes
+the tools cannot handle are reported as skipped.
+
+Synthetic images come from a seeded generator (--seed, default 0), so
+every run measures the same data. Stage results can be saved as a JSON
+baseline and later compared against it; a stage whose time or peak memory
+grows by more than --threshold is flagged as a regression and the exit
+status is 1.
+
+Usage:
+  py -3 bench_image_to_codes.py
+  py -3 bench_image_to_codes.py --sizes 32 256 1024 --repeat 3
+  py -3 bench_image_to_codes.py --pipeline --save baseline.json
+  py -3 bench_image_to_codes.py --compare baseline.json --threshold 0.2
+  py -3 bench_image_to_codes.py --sizes 8 16 32 --stages encode decode
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+import PIL
+from PIL import Image
+
+import codes_to_image
+import extract_codes
+import generate_codes_json
+import image_to_codes
+from codes_map import write_codes
+from image_to_codes import color_to_hex, encode_rows
+from pixel_codes import ROW_LABELS, row_labels
+
+ENCODER_SIZES = [32, 256, 1024]
+PIPELINE_SIZES = [8, 16, 32, 256, 1024]
+STAGES = ['encode', 'decode', 'extract', 'generate']
+
+
+def legacy_encode_rows(img, size, labels):
+    """The original per-pixel loop from `image_to_codes`, kept for comparison."""
+    rows = {}
+    for y in range(size):
+        row_label = labels[y]
+        codes = []
+        for x in range(size):
+            r, g, b, a = img.getpixel((x, y))
+            hexcol = color_to_hex(r, g, b, a if a != 255 else None)
+            codes.append(f"{size}{row_label}{x}_{hexcol}")
+        rows[row_label] = codes
+    return rows
+
+
+def synthetic_image(size, seed=0):
+    # random bytes with every 4th pixel forced opaque so both hex forms occur
+    data = bytearray(random.Random(seed).randbytes(size * size * 4))
+    data[3::16] = b'\xff' * len(data[3::16])
+    return Image.frombytes('RGBA', (size, size), bytes(data))
+
+
+def pixel_art_image(size, seed=0, colors=16):
+    """Pixel-art-like RGBA image: horizontal runs drawn from a small palette."""
+    rnd = random.Random(seed).randbytes(size * size)
+    palette = [bytes((i * 37 % 256, i * 91 % 256, i * 53 % 256, 255 if i % 5 else 0)) for i in range(colors)]
+    data = bytearray()
+    for i in range(0, size * size, 4):
+        data += palette[rnd[i] % colors] * min(4, size * size - i)
+    return Image.frombytes('RGBA', (size, size), bytes(data))
+
+
+def best_of(fn, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def peak_memory(fn):
+    """Peak traced Python memory of one run of `fn`."""
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run_encoder(sizes=ENCODER_SIZES, repeat=3, seed=0):
+    """Time the legacy and buffer encoders and print one line per size."""
+    print(f"{'size':>6} {'legacy (s)':>12} {'buffer (s)':>12} {'speedup':>9}")
+    for size in sizes:
+        img = synthetic_image(size, seed)
+        labels = row_labels(size)
+        t_old, old = best_of(lambda: legacy_encode_rows(img, size, labels), repeat)
+        t_new, new = best_of(lambda: encode_rows(img, size, labels), repeat)
+        if old != new:
+            raise SystemExit(f'Output mismatch at size {size}')
+        print(f"{size:>6} {t_old:>12.4f} {t_new:>12.4f} {t_old / t_new:>8.1f}x")
+
+
+def prepare(size, workdir, seed=0):
+    """Write the synthetic PNG and pixel-code JSON for `size`; returns paths."""
+    png = os.path.join(workdir, f'synthetic_{size}.png')
+    codes = os.path.join(workdir, f'synthetic_{size}.json')
+    pixel_art_image(size, seed).save(png)
+    image_to_codes.image_to_codes(png, size=size, output_path=codes)
+    return png, codes
+
+
+def stage_runner(stage, size, png, codes, workdir):
+    """Return a zero-argument callable running `stage` once."""
+    if stage == 'encode':
+        out = os.path.join(workdir, 'encode_out.json')
+        return lambda: image_to_codes.image_to_codes(png, size=size, output_path=out)
+    if stage == 'decode':
+        out = os.path.join(workdir, 'decode_out.png')
+        return lambda: codes_to_image.codes_json_to_image(codes, out)
+    if stage == 'extract':
+        out = os.path.join(workdir, 'extract_out.json')
+        return lambda: extract_codes.extract(codes, out)
+    if stage == 'generate':
+        out = os.path.join(workdir, 'codes_out.json')
+
+        def run():
+            with open(codes, 'r', encoding='utf-8') as f:
+                rows = json.load(f)['rows']
+            write_codes(out, generate_codes_json.build_codes_map(rows))
+        return run
+    raise ValueError(f'Unknown stage: {stage}')
+
+
+def stage_pixels(stage, size):
+    """Pixels one run of `stage` actually processes at `size`."""
+    if stage == 'generate':
+        # build_codes_map only reads the rows with single-letter labels
+        return min(size, len(ROW_LABELS)) * size
+    return size * size
+
+
+def run_pipeline(sizes=PIPELINE_SIZES, stages=STAGES, repeat=3, seed=0):
+    """Run every stage at every size; returns the results dict."""
+    results = {stage: {} for stage in stages}
+    workdir = tempfile.mkdtemp(prefix='bench_pipeline_')
+    try:
+        for size in sizes:
+            try:
+                png, codes = prepare(size, workdir, seed)
+            except Exception as e:
+                for stage in stages:
+                    results[stage][str(size)] = {'skipped': f'{type(e).__name__}: {e}'}
+                continue
+            for stage in stages:
+                fn = stage_runner(stage, size, png, codes, workdir)
+                seconds, _ = best_of(fn, repeat)
+                results[stage][str(size)] = {
+                    'seconds': round(seconds, 6),
+                    'pixels_per_sec': round(stage_pixels(stage, size) / seconds) if seconds else None,
+                    'peak_bytes': peak_memory(fn),
+                }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Return a list of regression messages against `baseline` results."""
+    regressions = []
+    for stage, by_size in results.items():
+        for size, cur in by_size.items():
+            old = baseline.get(stage, {}).get(size)
+            if not old or 'seconds' not in old or 'seconds' not in cur:
+                continue
+            for metric in ('seconds', 'peak_bytes'):
+                if old[metric] and cur[metric] > old[metric] * (1 + threshold):
+                    regressions.append(f'{stage} @ {size}: {metric} {old[metric]} -> {cur[metric]} '
+                                       f'(+{(cur[metric] / old[metric] - 1) * 100:.0f}%)')
+    return regressions
+
+
+def print_table(results):
+    print(f"{'stage':<9} {'size':>5} {'seconds':>10} {'pixels/s':>12} {'peak KiB':>10}")
+    for stage, by_size in results.items():
+        for size, r in by_size.items():
+            if 'skipped' in r:
+                print(f"{stage:<9} {size:>5}  skipped: {r['skipped']}")
+                continue
+            print(f"{stage:<9} {size:>5} {r['seconds']:>10.4f} {r['pixels_per_sec']:>12,} "
+                  f"{r['peak_bytes'] / 1024:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark image_to_codes row encoding or the pipeline stages')
+    parser.add_argument('--sizes', type=int, nargs='+', help='Image sizes to test (default 32 256 1024; with --pipeline 8 16 32 256 1024)')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per size; best time is reported (default 3)')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for the synthetic images (default 0)')
+    parser.add_argument('--pipeline', action='store_true', help='Benchmark the encode/decode/extract/generate stages')
+    parser.add_argument('--stages', nargs='+', choices=STAGES, help='Stages to run (default all; implies --pipeline)')
+    parser.add_argument('--save', metavar='PATH', help='Write stage results as a JSON baseline (implies --pipeline)')
+    parser.add_argument('--compare', metavar='PATH', help='Compare against a saved baseline and flag regressions (implies --pipeline)')
+    parser.add_argument('--threshold', type=float, default=0.15, help='Allowed relative slowdown/growth (default 0.15)')
+    args = parser.parse_args()
+
+    if not (args.pipeline or args.stages or args.save or args.compare):
+        run_encoder(args.sizes or ENCODER_SIZES, args.repeat, args.seed)
+        return
+
+    results = run_pipeline(args.sizes or PIPELINE_SIZES, args.stages or STAGES, args.repeat, args.seed)
+    print_table(results)
+
+    if args.save:
+        report = {
+            'meta': {
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'pillow': PIL.__version__,
+                'repeat': args.repeat,
+                'seed': args.seed,
+            },
+            'results': results,
+        }
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f'Saved baseline: {args.save}')
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            saved = json.load(f)
+        if saved.get('meta', {}).get('seed', args.seed) != args.seed:
+            print(f"Note: the baseline used --seed {saved['meta']['seed']}, this run --seed {args.seed}")
+        regressions = compare(results, saved['results'], args.threshold)
+        if regressions:
+            print(f'\n{len(regressions)} regression(s) over {args.threshold:.0%}:')
+            for msg in regressions:
+                print(f'  {msg}')
+            raise SystemExit(1)
+        print(f'\nNo regressions over {args.threshold:.0%} against {args.compare}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+build_code_shards.py
+
+Split `codes.json` into one small shard per secret key so the page only
+fetches the entry the user types. Each shard is named by the SHA-256 hex
+of its key (the same digest `script.js` computes with `sha256hex`) and
+holds the fully resolved code list; `manifest.json` tells the page that
+shards are available.
+
+  codes/manifest.json                 {"version": 1, "hash": "sha256", "count": 32}
+  codes/<sha256 of key>.json          ["32A0_00E9FF", ...]
+
+Keys are hashed exactly as stored; the page upper-cases what the user
+types before hashing, so keys should be upper case.
+
+Usage:
+  py -3 build_code_shards.py [codes.json] [--output-dir codes]
+"""
+import argparse
+import hashlib
+import json
+import os
+
+from codes_map import load_codes
+
+SHARD_DIR = 'codes'
+MANIFEST = 'manifest.json'
+VERSION = 1
+
+
+def key_digest(key):
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+def write_shards(codes_map, output_dir=SHARD_DIR):
+    """Write one shard per key of `codes_map` plus the manifest.
+
+    References (e.g. REVEAL_ALL) are resolved so every shard is
+    self-contained. Shards left over from earlier builds are removed.
+    Returns the manifest dict.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    written = set()
+    for key in codes_map:
+        name = f'{key_digest(key)}.json'
+        with open(os.path.join(output_dir, name), 'w', encoding='utf-8') as f:
+            json.dump(codes_map[key], f, separators=(',', ':'), ensure_ascii=False)
+        written.add(name)
+
+    # drop shards for keys that no longer exist (64 hex digits + '.json')
+    for name in os.listdir(output_dir):
+        if name.endswith('.json') and len(name) == 69 and name not in written:
+            os.remove(os.path.join(output_dir, name))
+
+    manifest = {'version': VERSION, 'hash': 'sha256', 'count': len(written)}
+    with open(os.path.join(output_dir, MANIFEST), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Split codes.json into per-key shards named by SHA-256')
+    parser.add_argument('input', nargs='?', default='codes.json', help='Path to codes.json (default codes.json)')
+    parser.add_argument('--output-dir', '-o', default=SHARD_DIR, help=f'Shard directory (default {SHARD_DIR})')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.input):
+        print(f'Error: {args.input} not found')
+        raise SystemExit(1)
+
+    manifest = write_shards(load_codes(args.input), args.output_dir)
+    print(f"Wrote {manifest['count']} shards to {args.output_dir}")
+
+
+if __name__ == '__main__':
+    main()
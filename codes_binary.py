@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""
+codes_binary.py
+
+Fixed-width binary companion format (.pxc) for pixel-code JSON, readable
+through `mmap` so single pixels and whole rows can be looked up without
+parsing the JSON.
+
+Layout (little-endian):
+  header   '<4sBBHHII'  magic b'PXC1', version (2), flags, size, row-label
+                        byte length, palette count, cell array offset
+  labels   UTF-8 row labels, one character per row (e.g. 'AB...f'); empty
+           when FLAG_DERIVED_LABELS is set (grids over 32 rows, whose
+           multi-letter labels are `pixel_codes.row_labels(size)`)
+  palette  per colour: 1 length byte + UTF-8 colour string ('00E9FF')
+  cells    size*size uint16 palette indexes, row-major; 0xFFFF = no code
+
+Converting `{"rows": ...}` JSON to .pxc and back is lossless for files
+with one code per pixel (as written by `image_to_codes.py`, including
+--rle and --palette files, which come back in the plain per-pixel form).
+
+Usage:
+  py -3 codes_binary.py to-bin as_pixels_codes_32x32.json -o sprite.pxc
+  py -3 codes_binary.py to-json sprite.pxc -o as_pixels_codes_32x32.json
+  py -3 codes_binary.py get sprite.pxc H 11
+  py -3 codes_binary.py get sprite.pxc 7 11
+"""
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+
+from pixel_codes import ROW_LABELS, parse_many, row_labels
+
+MAGIC = b'PXC1'
+VERSION = 2
+HEADER = struct.Struct('<4sBBHHII')
+EMPTY = 0xFFFF
+# codes were written without the '_' between position and colour
+FLAG_NO_SEPARATOR = 0x01
+# no label bytes; the labels are row_labels(size)
+FLAG_DERIVED_LABELS = 0x02
+
+
+def encode_binary(data):
+    """Build the .pxc bytes for a loaded pixel-code JSON dict."""
+    rows = data.get('rows')
+    if not rows or not isinstance(rows, dict):
+        raise ValueError("Input JSON must contain a top-level 'rows' object")
+    json_palette = data.get('palette')
+
+    parsed_rows = []
+    size = None
+    separators = set()
+    for label, codes in rows.items():
+        parsed_codes = []
+        for code, rec in zip(codes, parse_many(codes)):
+            if rec.row != label:
+                raise ValueError(f'Code {code!r} does not belong to row {label!r}')
+            if size is None:
+                size = rec.size
+            elif rec.size != size:
+                raise ValueError(f'Code {code!r} does not match size {size}')
+            color = rec.color
+            if json_palette is not None:
+                if not color.isdigit() or int(color) >= len(json_palette):
+                    raise ValueError(f'Code {code!r} has no palette entry')
+                color = json_palette[int(color)]
+            separators.add('_' in code)
+            parsed_codes.append((rec.col, rec.end, color))
+        parsed_rows.append((label, parsed_codes))
+    if size is None:
+        raise ValueError('No pixel codes found')
+    if len(separators) > 1:
+        raise ValueError("Codes mix forms with and without '_'; cannot store losslessly")
+    if size > 0xFFFF:
+        raise ValueError(f'Size {size} is too large for the .pxc header')
+    labels = row_labels(size)
+    row_y = {label: y for y, label in enumerate(labels)}
+
+    palette = {}
+    cells = [EMPTY] * (size * size)
+    for label, parsed_codes in parsed_rows:
+        y = row_y.get(label)
+        if y is None:
+            raise ValueError(f'Row {label!r} is outside the {size}-row label range')
+        for col, end, color in parsed_codes:
+            idx = palette.setdefault(color, len(palette))
+            if idx >= EMPTY:
+                raise ValueError('Too many distinct colours for 16-bit cells')
+            for x in range(col, end + 1):
+                if x >= size:
+                    raise ValueError(f'Column {x} out of range in row {label!r}')
+                if cells[y * size + x] != EMPTY:
+                    raise ValueError(f'Duplicate column {x} in row {label!r}')
+                cells[y * size + x] = idx
+
+    derived = size > len(ROW_LABELS)
+    label_bytes = b'' if derived else ''.join(labels).encode('utf-8')
+    palette_bytes = bytearray()
+    for color in palette:
+        raw = color.encode('utf-8')
+        if len(raw) > 255:
+            raise ValueError(f'Colour string too long: {color!r}')
+        palette_bytes.append(len(raw))
+        palette_bytes += raw
+
+    # keep the cell array 4-byte aligned
+    offset = HEADER.size + len(label_bytes) + len(palette_bytes)
+    offset += -offset % 4
+    flags = FLAG_NO_SEPARATOR if separators == {False} else 0
+    if derived:
+        flags |= FLAG_DERIVED_LABELS
+    header = HEADER.pack(MAGIC, VERSION, flags, size, len(label_bytes), len(palette), offset)
+    out = bytearray(header + label_bytes + palette_bytes)
+    out += bytes(offset - len(out))
+    out += struct.pack(f'<{size * size}H', *cells)
+    return bytes(out)
+
+
+class PixelCodeFile:
+    """Read-only, memory-mapped view of a .pxc file.
+
+    `color(row, col)` and `code(row, col)` are O(1); `row_cells(row)` returns
+    a zero-copy memoryview of palette indexes. `row` may be a row label or
+    a row index.
+
+    Views from `row_cells` stay valid after `close()`: if any are still
+    alive, the mapping is only unmapped once the last one is released.
+    """
+
+    def __init__(self, path):
+        self._file = open(path, 'rb')
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, flags, size, label_len, palette_count, offset = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f'{path} is not a version {VERSION} .pxc file')
+        self.size = size
+        self.separator = '' if flags & FLAG_NO_SEPARATOR else '_'
+        pos = HEADER.size
+        if flags & FLAG_DERIVED_LABELS:
+            self.labels = row_labels(size)
+        else:
+            self.labels = list(self._mm[pos:pos + label_len].decode('utf-8'))
+        self.row_index = {label: y for y, label in enumerate(self.labels)}
+        pos += label_len
+        self.palette = []
+        for _ in range(palette_count):
+            n = self._mm[pos]
+            self.palette.append(self._mm[pos + 1:pos + 1 + n].decode('utf-8'))
+            pos += 1 + n
+        self._offset = offset
+        if sys.byteorder == 'little':
+            self._cells = memoryview(self._mm)[offset:offset + size * size * 2].cast('H')
+        else:
+            self._cells = None
+
+    def close(self):
+        if getattr(self, '_cells', None) is not None:
+            self._cells.release()
+            self._cells = None
+        if not self._mm.closed:
+            try:
+                self._mm.close()
+            except BufferError:
+                # a caller still holds a row_cells view; the map is freed with it
+                pass
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _y(self, row):
+        if isinstance(row, int):
+            if not 0 <= row < self.size:
+                raise IndexError('row out of range')
+            return row
+        return self.row_index[row]
+
+    def cell(self, row, col):
+        """Palette index at (row, col), or None if the pixel has no code."""
+        if not 0 <= col < self.size:
+            raise IndexError('column out of range')
+        i = self._y(row) * self.size + col
+        if self._cells is not None:
+            v = self._cells[i]
+        else:
+            v = struct.unpack_from('<H', self._mm, self._offset + 2 * i)[0]
+        return None if v == EMPTY else v
+
+    def color(self, row, col):
+        """Colour string at (row, col), or None if the pixel has no code."""
+        v = self.cell(row, col)
+        return None if v is None else self.palette[v]
+
+    def code(self, row, col):
+        """Pixel code string at (row, col), or None if the pixel has no code."""
+        y = self._y(row)
+        color = self.color(y, col)
+        if color is None:
+            return None
+        return f"{self.size}{self.labels[y]}{col}{self.separator}{color}"
+
+    def row_cells(self, row):
+        """Palette indexes of a whole row (zero-copy memoryview when possible).
+
+        The view keeps the mapping alive; call `release()` on it (or drop it)
+        to let the file be unmapped.
+        """
+        start = self._y(row) * self.size
+        if self._cells is not None:
+            return self._cells[start:start + self.size]
+        return struct.unpack_from(f'<{self.size}H', self._mm, self._offset + 2 * start)
+
+    def row_codes(self, row):
+        """Pixel codes of a whole row, skipping pixels without a code."""
+        y = self._y(row)
+        prefix = f"{self.size}{self.labels[y]}"
+        sep = self.separator
+        palette = self.palette
+        return [f"{prefix}{x}{sep}{palette[v]}" for x, v in enumerate(self.row_cells(y)) if v != EMPTY]
+
+    def to_json_data(self):
+        """Rebuild the `{"rows": ...}` dict."""
+        return {"rows": {label: self.row_codes(y) for y, label in enumerate(self.labels)
+                         if any(v != EMPTY for v in self.row_cells(y))}}
+
+
+def json_to_binary(input_path, output_path=None):
+    with open(input_path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if not output_path:
+        output_path = os.path.splitext(os.path.basename(input_path))[0] + '.pxc'
+    with open(output_path, 'wb') as f:
+        f.write(encode_binary(data))
+    return output_path
+
+
+def binary_to_json(input_path, output_path=None):
+    with PixelCodeFile(input_path) as pxc:
+        out = pxc.to_json_data()
+    if not output_path:
+        output_path = os.path.splitext(os.path.basename(input_path))[0] + '.json'
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(out, f, indent=2, ensure_ascii=False)
+    return output_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert pixel-code JSON to/from the mmap-able .pxc format')
+    sub = parser.add_subparsers(dest='command', required=True)
+    p = sub.add_parser('to-bin', help='Convert pixel-code JSON to .pxc')
+    p.add_argument('input', help='Path to pixel-code JSON')
+    p.add_argument('--output', '-o', help='Output .pxc path (optional)')
+    p = sub.add_parser('to-json', help='Convert .pxc back to pixel-code JSON')
+    p.add_argument('input', help='Path to .pxc file')
+    p.add_argument('--output', '-o', help='Output JSON path (optional)')
+    p = sub.add_parser('get', help='Print the code at a row and column')
+    p.add_argument('input', help='Path to .pxc file')
+    p.add_argument('row', help='Row label or index (e.g. H or 7)')
+    p.add_argument('col', type=int, help='Column index')
+    args = parser.parse_args()
+
+    if args.command == 'to-bin':
+        print(f'Wrote binary codes: {json_to_binary(args.input, args.output)}')
+    elif args.command == 'to-json':
+        print(f'Wrote codes JSON: {binary_to_json(args.input, args.output)}')
+    else:
+        row = int(args.row) if args.row.isdigit() else args.row
+        with PixelCodeFile(args.input) as pxc:
+            try:
+                print(pxc.code(row, args.col))
+            except (KeyError, IndexError) as e:
+                print(f'Error: no pixel at row {args.row}, column {args.col} ({e})')
+                raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+codes_delta.py
+
+Compare two pixel-code JSONs and write only what changed, so an edit of a
+few pixels ships (and re-renders) as a few codes.
+
+Delta layout:
+  {"format": "delta", "size": 32,
+   "rows": {"H": ["32H11_FF0000", "32H12-14_00E9FF"]},
+   "removed": {"B": [3, 4]}}
+
+`rows` holds changed or added pixels in the usual code syntax (runs of
+adjacent changes with one colour become span codes); `removed` lists
+columns that have no code in the new file and render transparent.
+
+Apply a delta to an existing render with
+`codes_to_image.py --apply-delta delta.json --base old.png`, or to the old
+JSON with `codes_delta.py apply`.
+
+Usage:
+  py -3 codes_delta.py diff old.json new.json -o edit.delta.json
+  py -3 codes_delta.py apply old.json edit.delta.json -o new.json
+"""
+import argparse
+import json
+
+from pixel_codes import parse_code, parse_many, row_index, row_labels
+
+
+def pixel_colors(data):
+    """Return (size, {row_label: {col: colour}}) for a pixel-code dict.
+
+    Spans are expanded and palette indexes resolved; like `codes_to_image`,
+    codes whose label disagrees with their row or that fall outside the
+    image are ignored.
+    """
+    rows = data.get('rows')
+    if not rows:
+        raise ValueError('JSON missing "rows" key')
+    first_row = next(iter(rows.values()))
+    if not first_row:
+        raise ValueError('No pixel codes found')
+    size = parse_code(first_row[0]).size
+    palette = data.get('palette')
+
+    pixels = {}
+    for label, codes in rows.items():
+        y = row_index(label)
+        if y is None or y >= size:
+            continue
+        row = pixels.setdefault(label, {})
+        for rec in parse_many(codes, palette):
+            if rec.row != label:
+                continue
+            for x in range(rec.col, min(rec.end, size - 1) + 1):
+                row[x] = rec.color
+    return size, pixels
+
+
+def changed_codes(size, label, changes):
+    """Format {col: colour} changes as codes, merging adjacent equal colours."""
+    codes = []
+    cols = sorted(changes)
+    i = 0
+    while i < len(cols):
+        start = end = cols[i]
+        color = changes[start]
+        while i + 1 < len(cols) and cols[i + 1] == end + 1 and changes[cols[i + 1]] == color:
+            i += 1
+            end = cols[i]
+        if end == start:
+            codes.append(f"{size}{label}{start}_{color}")
+        else:
+            codes.append(f"{size}{label}{start}-{end}_{color}")
+        i += 1
+    return codes
+
+
+def diff_codes(old_data, new_data):
+    """Build the delta that turns `old_data` into `new_data`."""
+    old_size, old_pixels = pixel_colors(old_data)
+    size, new_pixels = pixel_colors(new_data)
+    if old_size != size:
+        raise ValueError(f'Cannot diff different sizes ({old_size} vs {size})')
+
+    changed = {}
+    removed = {}
+    for label in row_labels(size):
+        old_row = old_pixels.get(label, {})
+        new_row = new_pixels.get(label, {})
+        changes = {x: c for x, c in new_row.items() if old_row.get(x) != c}
+        if changes:
+            changed[label] = changed_codes(size, label, changes)
+        gone = sorted(x for x in old_row if x not in new_row)
+        if gone:
+            removed[label] = gone
+
+    delta = {'format': 'delta', 'size': size, 'rows': changed}
+    if removed:
+        delta['removed'] = removed
+    return delta
+
+
+def delta_pixel_count(delta):
+    """Number of pixels a delta touches."""
+    n = sum(len(cols) for cols in delta.get('removed', {}).values())
+    for codes in delta.get('rows', {}).values():
+        n += sum(rec.end - rec.col + 1 for rec in parse_many(codes))
+    return n
+
+
+def apply_delta_to_data(data, delta):
+    """Return a new plain `{"rows": ...}` dict with `delta` applied to `data`."""
+    size, pixels = pixel_colors(data)
+    if delta.get('size') != size:
+        raise ValueError(f"Delta size {delta.get('size')} does not match {size}")
+    for label, cols in delta.get('removed', {}).items():
+        row = pixels.get(label, {})
+        for x in cols:
+            row.pop(x, None)
+    for label, codes in delta.get('rows', {}).items():
+        row = pixels.setdefault(label, {})
+        for rec in parse_many(codes):
+            for x in range(rec.col, rec.end + 1):
+                row[x] = rec.color
+
+    rows = {}
+    for label in row_labels(size):
+        row = pixels.get(label)
+        if row:
+            rows[label] = [f"{size}{label}{x}_{row[x]}" for x in sorted(row)]
+    return {'rows': rows}
+
+
+def _load(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Diff pixel-code JSONs and apply deltas')
+    sub = parser.add_subparsers(dest='command', required=True)
+    p = sub.add_parser('diff', help='Write the delta between two pixel-code JSONs')
+    p.add_argument('old', help='Original pixel-code JSON')
+    p.add_argument('new', help='Edited pixel-code JSON')
+    p.add_argument('--output', '-o', default='codes.delta.json', help='Delta output path (default codes.delta.json)')
+    p = sub.add_parser('apply', help='Apply a delta to a pixel-code JSON')
+    p.add_argument('input', help='Original pixel-code JSON')
+    p.add_argument('delta', help='Delta JSON')
+    p.add_argument('--output', '-o', required=True, help='Output pixel-code JSON path')
+    args = parser.parse_args()
+
+    if args.command == 'diff':
+        delta = diff_codes(_load(args.old), _load(args.new))
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(delta, f, indent=2, ensure_ascii=False)
+        print(f'Wrote delta ({delta_pixel_count(delta)} pixels changed): {args.output}')
+    else:
+        out = apply_delta_to_data(_load(args.input), _load(args.delta))
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(out, f, indent=2, ensure_ascii=False)
+        print(f'Wrote codes JSON: {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+codes_index.py
+
+Reverse lookup over `codes.json`: which secret keys contain a pixel code,
+use a colour, or cover a position. Answering that from `codes.json` means
+scanning every list (and expanding REVEAL_ALL); this keeps a persistent
+inverted index in SQLite next to it instead.
+
+  keys      key, position in the map, digest of its stored value
+  postings  one row per code: code, grid size, row label, column span,
+            colour, key
+  refs      key -> key edges from `{"$refs": [...]}` entries
+
+Only a key's own codes are posted; keys that reference it (REVEAL_ALL) are
+added at query time by following `refs`, so the index stays about the size
+of the rows. Span codes match every column they cover.
+
+Updates are incremental: each key's stored value is hashed and only keys
+whose digest changed (or that appeared / disappeared) are re-posted, so
+re-running after `generate_codes_json.py`, a remap script or a watch-mode
+update touches just the changed keys.
+
+Usage:
+  py -3 codes_index.py build [codes.json] [--index codes.index.sqlite]
+  py -3 codes_index.py query --code 32H11_FF0000
+  py -3 codes_index.py query --color FF0000
+  py -3 codes_index.py query --pos H11
+  py -3 generate_codes_json.py --index
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+
+from codes_map import REFS, is_ref
+from pixel_codes import BASE_BASIC_COLORS, CODE_RE, color_to_rgba_bytes, hex_to_rgba
+
+INDEX_PATH = 'codes.index.sqlite'
+# bump when postings change meaning so existing indexes are rebuilt
+INDEX_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS keys (key TEXT PRIMARY KEY, ord INTEGER NOT NULL, digest TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS postings (
+    key TEXT NOT NULL, code TEXT NOT NULL, size INTEGER, row TEXT, col INTEGER, col_end INTEGER, color TEXT);
+CREATE TABLE IF NOT EXISTS refs (key TEXT NOT NULL, target TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS postings_code ON postings (code);
+CREATE INDEX IF NOT EXISTS postings_color ON postings (color);
+CREATE INDEX IF NOT EXISTS postings_pos ON postings (row, col);
+CREATE INDEX IF NOT EXISTS postings_key ON postings (key);
+CREATE INDEX IF NOT EXISTS refs_target ON refs (target);
+CREATE INDEX IF NOT EXISTS refs_key ON refs (key);
+"""
+
+
+def normalize_color(color):
+    """Canonical RRGGBBAA hex, resolved like the shared parser does
+    (`pixel_codes.color_to_rgba_bytes`), so 'F00', 'FF0000', 'FF0000FF'
+    and 'red' are one colour. Colours the parser cannot resolve are kept
+    as upper-case text rather than all matching its magenta fallback."""
+    color = color.strip()
+    if hex_to_rgba(color) is None and color.lower() not in BASE_BASIC_COLORS:
+        return color.lstrip('#').upper()
+    return color_to_rgba_bytes(color).hex().upper()
+
+
+def value_digest(value):
+    raw = json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return hashlib.sha256(raw).hexdigest()
+
+
+def _postings(key, codes):
+    for code in codes:
+        m = CODE_RE.match(code) if isinstance(code, str) else None
+        if m is None:
+            yield key, str(code), None, None, None, None, None
+            continue
+        size, row, col, end, color = m.groups()
+        col = int(col)
+        yield key, code.strip(), int(size), row, col, int(end) if end else col, normalize_color(color)
+
+
+class CodesIndex:
+    """Inverted index over a codes map, stored in the SQLite file `path`."""
+
+    def __init__(self, path=INDEX_PATH):
+        # imported here so scripts that only name INDEX_PATH start without sqlite3
+        import sqlite3
+        self.path = path
+        self.db = sqlite3.connect(path)
+        if self.db.execute('PRAGMA user_version').fetchone()[0] != INDEX_VERSION:
+            # the table layout may have changed too, so start from scratch
+            with self.db:
+                for table in ('keys', 'postings', 'refs'):
+                    self.db.execute(f'DROP TABLE IF EXISTS {table}')
+                self.db.execute(f'PRAGMA user_version = {INDEX_VERSION}')
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def update(self, codes_map):
+        """Re-post the keys of `codes_map` whose value changed; drop keys that
+        are gone. Returns the list of keys (re)indexed or removed."""
+        stored = dict(self.db.execute('SELECT key, digest FROM keys'))
+        changed = []
+        with self.db:
+            for ord_, (key, value) in enumerate(codes_map.items()):
+                digest = value_digest(value)
+                if stored.pop(key, None) == digest:
+                    self.db.execute('UPDATE keys SET ord = ? WHERE key = ?', (ord_, key))
+                    continue
+                self._drop(key)
+                self.db.execute('INSERT INTO keys VALUES (?, ?, ?)', (key, ord_, digest))
+                if is_ref(value):
+                    targets = [item for item in value[REFS] if isinstance(item, str)]
+                    self.db.executemany('INSERT INTO refs VALUES (?, ?)', [(key, t) for t in targets])
+                    for item in value[REFS]:
+                        if not isinstance(item, str):
+                            self.db.executemany('INSERT INTO postings VALUES (?, ?, ?, ?, ?, ?, ?)',
+                                                _postings(key, item))
+                else:
+                    self.db.executemany('INSERT INTO postings VALUES (?, ?, ?, ?, ?, ?, ?)', _postings(key, value))
+                changed.append(key)
+            for key in stored:
+                self._drop(key)
+                changed.append(key)
+        return changed
+
+    def _drop(self, key):
+        self.db.execute('DELETE FROM keys WHERE key = ?', (key,))
+        self.db.execute('DELETE FROM postings WHERE key = ?', (key,))
+        self.db.execute('DELETE FROM refs WHERE key = ?', (key,))
+
+    def _with_referrers(self, keys):
+        """`keys` plus every key that references one of them, in map order."""
+        found = set(keys)
+        frontier = list(found)
+        while frontier:
+            marks = ','.join('?' * len(frontier))
+            rows = self.db.execute(f'SELECT DISTINCT key FROM refs WHERE target IN ({marks})', frontier)
+            frontier = [k for (k,) in rows if k not in found]
+            found.update(frontier)
+        if not found:
+            return []
+        marks = ','.join('?' * len(found))
+        return [k for (k,) in self.db.execute(f'SELECT key FROM keys WHERE key IN ({marks}) ORDER BY ord',
+                                             list(found))]
+
+    def _keys(self, where, params):
+        rows = self.db.execute(f'SELECT DISTINCT key FROM postings WHERE {where}', params)
+        return self._with_referrers([k for (k,) in rows])
+
+    def keys_for_code(self, code):
+        """Keys holding the pixel `code` at the same grid size (span codes
+        that cover it count)."""
+        m = CODE_RE.match(code)
+        if m is None:
+            return self._keys('code = ?', (code.strip(),))
+        size, row, col, end, color = m.groups()
+        col = int(col)
+        end = int(end) if end else col
+        return self._keys('size = ? AND row = ? AND col <= ? AND col_end >= ? AND color = ?',
+                          (int(size), row, col, end, normalize_color(color)))
+
+    def keys_for_color(self, color):
+        """Keys that use `color` (hex, with or without '#', or a basic colour
+        name such as 'red', which matches its hex form too)."""
+        return self._keys('color = ?', (normalize_color(color),))
+
+    def keys_at(self, row, col):
+        """Keys with any code at row label `row`, column `col`."""
+        return self._keys('row = ? AND col <= ? AND col_end >= ?', (row, int(col), int(col)))
+
+
+def update_index(index_path, codes_map):
+    """Bring the index at `index_path` in line with `codes_map`; returns changed keys."""
+    with CodesIndex(index_path) as index:
+        return index.update(codes_map)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build or query the codes.json reverse-lookup index')
+    parser.add_argument('--index', default=INDEX_PATH, help=f'Index file (default {INDEX_PATH})')
+    sub = parser.add_subparsers(dest='command', required=True)
+    p = sub.add_parser('build', help='Create or incrementally update the index')
+    p.add_argument('codes', nargs='?', default='codes.json', help='codes.json path (default codes.json)')
+    p = sub.add_parser('query', help='Find keys by code, colour or position')
+    group = p.add_mutually_exclusive_group(required=True)
+    group.add_argument('--code', help='Pixel code, e.g. 32H11_FF0000')
+    group.add_argument('--color', help='Colour, e.g. FF0000 or red')
+    group.add_argument('--pos', help='Row label and column, e.g. H11')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        if not os.path.exists(args.codes):
+            print(f'Error: {args.codes} not found')
+            raise SystemExit(1)
+        with open(args.codes, 'r', encoding='utf-8') as f:
+            codes_map = json.load(f)
+        start = time.perf_counter()
+        changed = update_index(args.index, codes_map)
+        print(f'Indexed {len(changed)} changed keys of {len(codes_map)} into {args.index} '
+              f'in {time.perf_counter() - start:.3f}s')
+        return
+
+    if not os.path.exists(args.index):
+        print(f'Error: {args.index} not found (run: py -3 codes_index.py build)')
+        raise SystemExit(1)
+    with CodesIndex(args.index) as index:
+        start = time.perf_counter()
+        if args.code:
+            keys = index.keys_for_code(args.code)
+        elif args.color:
+            keys = index.keys_for_color(args.color)
+        else:
+            row = args.pos.rstrip('0123456789')
+            col = args.pos[len(row):]
+            if not row or not col:
+                parser.error('--pos takes a row label followed by a column, e.g. H11')
+            keys = index.keys_at(row, col)
+        elapsed = time.perf_counter() - start
+    for key in keys:
+        print(key)
+    print(f'{len(keys)} keys ({elapsed * 1000:.3f} ms)')
+
+
+if __name__ == '__main__':
+    main()
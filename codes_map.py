@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+codes_map.py
+
+Helpers for `codes.json` (secret key -> list of pixel codes).
+
+`REVEAL_ALL` can be stored either as a full flattened copy of every list
+(the legacy form) or as a reference entry:
+
+  "REVEAL_ALL": {"$refs": ["ROW_A", "ROW_B", ..., ["32f0_00E9FF", ...]]}
+
+Each item of `$refs` is another key, whose codes are spliced in, or an
+inline list of codes for rows that have no key of their own. References
+are expanded lazily by `resolve` / `LazyCodesMap` here and by
+`resolveCodes` in `script.js`.
+"""
+import json
+import os
+from collections.abc import Mapping
+
+REVEAL_ALL = 'REVEAL_ALL'
+REFS = '$refs'
+
+
+def is_ref(value):
+    return isinstance(value, dict) and REFS in value
+
+
+def make_refs(keys, extra_lists=()):
+    """Build a reference entry for `keys`, followed by inline code lists."""
+    return {REFS: list(keys) + [list(codes) for codes in extra_lists if codes]}
+
+
+def refs_for(codes_map, flat):
+    """Express the flat code list `flat` as references to keys of `codes_map`.
+
+    Keys are matched greedily in map order; any codes not covered by a key
+    are kept as inline lists. Returns None if `flat` is empty.
+    """
+    if not flat:
+        return None
+    by_first = {}
+    for key, value in codes_map.items():
+        if key != REVEAL_ALL and isinstance(value, list) and value:
+            by_first.setdefault(value[0], []).append(key)
+    items = []
+    pending = []
+    i = 0
+    while i < len(flat):
+        match = None
+        for key in by_first.get(flat[i], ()):
+            value = codes_map[key]
+            if flat[i:i + len(value)] == value:
+                match = key
+                break
+        if match is None:
+            pending.append(flat[i])
+            i += 1
+            continue
+        if pending:
+            items.append(pending)
+            pending = []
+        items.append(match)
+        i += len(codes_map[match])
+    if pending:
+        items.append(pending)
+    return {REFS: items}
+
+
+def carry_reveal_all(old_map, new_map, renames):
+    """Rebuild `old_map`'s REVEAL_ALL as references into the remapped `new_map`.
+
+    Referenced keys are renamed through `renames`; references to keys that
+    did not survive the remap are inlined, and a legacy flat list is turned
+    into references. Returns None if `old_map` has no REVEAL_ALL.
+    """
+    value = old_map.get(REVEAL_ALL)
+    if value is None:
+        return None
+    if not is_ref(value):
+        return refs_for(new_map, value) or []
+    items = []
+    for item in value[REFS]:
+        if isinstance(item, str):
+            new_key = renames.get(item, item)
+            if new_key in new_map:
+                items.append(new_key)
+                continue
+            item = resolve(old_map, item)
+        items.append(list(item))
+    return {REFS: items}
+
+
+def resolve(codes_map, key, _seen=None):
+    """Return the code list for `key`, expanding references."""
+    value = codes_map[key]
+    if not is_ref(value):
+        return value
+    seen = set() if _seen is None else _seen
+    if key in seen:
+        raise ValueError(f'Reference cycle through {key!r}')
+    seen.add(key)
+    out = []
+    for item in value[REFS]:
+        if isinstance(item, str):
+            out.extend(resolve(codes_map, item, seen))
+        else:
+            out.extend(item)
+    seen.discard(key)
+    return out
+
+
+class LazyCodesMap(Mapping):
+    """Read-only view of a codes map that expands references on access."""
+
+    def __init__(self, data):
+        self._data = data
+        self._resolved = {}
+
+    def __getitem__(self, key):
+        if key not in self._resolved:
+            self._resolved[key] = resolve(self._data, key)
+        return self._resolved[key]
+
+    def __iter__(self):
+        return iter(self._data)
+
+    def __len__(self):
+        return len(self._data)
+
+
+def expand_all(codes_map):
+    """Return a copy of `codes_map` with every reference expanded (legacy form)."""
+    return {key: resolve(codes_map, key) for key in codes_map}
+
+
+def load_codes(path):
+    """Load `codes.json` as a LazyCodesMap."""
+    with open(path, 'r', encoding='utf-8') as f:
+        return LazyCodesMap(json.load(f))
+
+
+def write_codes(path, codes_map, legacy=False):
+    """Write `codes_map` to `path`; `legacy` expands references first.
+
+    The JSON goes to a temp file next to `path` that then replaces it, so
+    readers (the page, a watcher) never see a half-written file. If a shard
+    directory (`codes/manifest.json`, see `build_code_shards.py`) sits next
+    to `path`, its shards are rewritten too, since the page reads only the
+    shards once they exist. Returns that shard directory, or None.
+    """
+    if legacy:
+        codes_map = expand_all(codes_map)
+    tmp = f'{path}.{os.getpid()}.tmp'
+    try:
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(codes_map, f, indent=2, ensure_ascii=False)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return refresh_shards(path, codes_map)
+
+
+def refresh_shards(path, codes_map):
+    """Rewrite the shards next to codes.json at `path` if there are any."""
+    # imported here: build_code_shards imports this module
+    from build_code_shards import MANIFEST, SHARD_DIR, write_shards
+
+    shard_dir = os.path.join(os.path.dirname(path), SHARD_DIR)
+    if not os.path.exists(os.path.join(shard_dir, MANIFEST)):
+        return None
+    write_shards(LazyCodesMap(codes_map), shard_dir)
+    return shard_dir
@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+codes_store.py
+
+Content-addressed store for pixel-code files. Across a sprite library most
+rows repeat (fully transparent rows, solid `00E9FF` background runs) and
+so do whole sprites, so each unique payload is kept once:
+
+  row object    the row's codes with the row label replaced by `*`
+                (`32A0_00E9FF` -> `32*0_00E9FF`), so the same pixels on a
+                different row share one object
+  image object  the file's other top-level data (palette, animation
+                frames, ...) plus its rows as [label, row hash] pairs
+
+Objects live under `objects/<2 hex>/<sha256>` as compact JSON. `refs.json`
+maps file names to image hashes, so identical sprites share one image
+object. Reading a ref rebuilds the usual `{"rows": ...}` JSON on demand
+(the same bytes `image_to_codes.py` writes for plain and palette files).
+
+Files are ingested row by row (`codes_stream.iter_rows`), so large grids
+and .ndjson work without loading the whole file.
+
+Usage:
+  py -3 codes_store.py put codes/*.json [--store .codes_store]
+  py -3 codes_store.py get as_pixels_codes_32x32.json -o rebuilt.json
+  py -3 codes_store.py ls
+  py -3 codes_store.py stats
+  py -3 codes_store.py gc
+  py -3 image_to_codes.py as.png --store
+  py -3 generate_codes_json.py --store
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+
+from codes_stream import iter_rows, write_rows
+
+STORE_DIR = '.codes_store'
+REFS_FILE = 'refs.json'
+
+_LABEL_RE = re.compile(r'(\d+)([A-Za-z]+)')
+
+
+def _canonical(obj):
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def strip_label(label, codes):
+    """Replace the row label in each code with `*` (codes of other rows are kept as they are)."""
+    out = []
+    for code in codes:
+        m = _LABEL_RE.match(code) if isinstance(code, str) else None
+        if m is not None and m.group(2) == label:
+            code = f'{m.group(1)}*{code[m.end():]}'
+        out.append(code)
+    return out
+
+
+def restore_label(label, codes):
+    """Inverse of `strip_label`."""
+    out = []
+    for code in codes:
+        if isinstance(code, str):
+            i = code.find('*')
+            if i > 0 and code[:i].isdigit():
+                code = f'{code[:i]}{label}{code[i + 1:]}'
+        out.append(code)
+    return out
+
+
+class CodesStore:
+    """Content-addressed object store plus a name -> image hash ref table.
+
+    `stats` counts objects written and objects found already present for
+    this instance. With `defer_refs`, `set_ref` only collects names in
+    `pending_refs` (for worker processes, whose parent then writes them all
+    with `update_refs`, so concurrent workers never rewrite refs.json).
+    """
+
+    def __init__(self, path=STORE_DIR, defer_refs=False):
+        self.path = path
+        self.stats = {'written': 0, 'deduplicated': 0}
+        self.pending_refs = {} if defer_refs else None
+        os.makedirs(os.path.join(path, 'objects'), exist_ok=True)
+
+    def _object_path(self, h):
+        return os.path.join(self.path, 'objects', h[:2], h)
+
+    def put_object(self, obj):
+        """Store `obj` (JSON-serialisable) once; returns its SHA-256 hex."""
+        raw = _canonical(obj)
+        h = hashlib.sha256(raw).hexdigest()
+        path = self._object_path(h)
+        if os.path.exists(path):
+            self.stats['deduplicated'] += 1
+            return h
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f'{path}.{os.getpid()}.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(raw)
+        os.replace(tmp, path)
+        self.stats['written'] += 1
+        return h
+
+    def get_object(self, h):
+        with open(self._object_path(h), 'rb') as f:
+            return json.loads(f.read())
+
+    def put_rows(self, rows, meta=None):
+        """Store (label, codes) pairs plus `meta`; returns the image hash.
+
+        `meta` may still be filled while `rows` is consumed (as
+        `codes_stream.iter_rows` does), so it is read afterwards.
+        """
+        refs = [[label, self.put_object(strip_label(label, codes))] for label, codes in rows]
+        meta = dict(meta or {})
+        # animations keep their pixels in meta['frames'] and have no "rows"
+        image = {'meta': meta, 'rows': None if meta.get('format') == 'animation' else refs}
+        return self.put_object(image)
+
+    def put_data(self, data):
+        """Store an in-memory pixel-code dict; returns the image hash."""
+        meta = {k: v for k, v in data.items() if k != 'rows'}
+        return self.put_rows(data.get('rows', {}).items(), meta)
+
+    def put_file(self, path, name=None):
+        """Ingest a .json/.ndjson pixel-code file under `name` (default: path)."""
+        meta = {}
+        h = self.put_rows(iter_rows(path, meta), meta)
+        self.set_ref(name or path, h)
+        return h
+
+    def iter_rows(self, ref):
+        """Yield (label, codes) for the file stored under `ref` (name or hash)."""
+        image = self.get_object(self.resolve(ref))
+        for label, h in image['rows'] or ():
+            yield label, restore_label(label, self.get_object(h))
+
+    def read_data(self, ref):
+        """Rebuild the pixel-code dict for `ref` (name or image hash)."""
+        image = self.get_object(self.resolve(ref))
+        data = dict(image['meta'])
+        if image['rows'] is not None:
+            data['rows'] = {label: restore_label(label, self.get_object(h)) for label, h in image['rows']}
+        return data
+
+    def write_file(self, ref, output_path):
+        """Write the file stored under `ref` to `output_path` (.json or .ndjson)."""
+        image = self.get_object(self.resolve(ref))
+        if image['rows'] is None:
+            with open(output_path, 'w', encoding='utf-8') as f:
+                json.dump(image['meta'], f, indent=2, ensure_ascii=False)
+            return output_path
+        write_rows(output_path, self.iter_rows(ref), image['meta'])
+        return output_path
+
+    def refs(self):
+        try:
+            with open(os.path.join(self.path, REFS_FILE), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def set_ref(self, name, h):
+        if self.pending_refs is not None:
+            self.pending_refs[os.path.normpath(name)] = h
+            return
+        self.update_refs({name: h})
+
+    def update_refs(self, names):
+        """Point each name in the {name: image hash} dict `names` at its hash."""
+        refs = self.refs()
+        for name, h in names.items():
+            refs[os.path.normpath(name)] = h
+        path = os.path.join(self.path, REFS_FILE)
+        tmp = f'{path}.{os.getpid()}.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(refs, f, indent=2, ensure_ascii=False)
+        os.replace(tmp, path)
+
+    def resolve(self, ref):
+        """Image hash for a ref name, or `ref` itself if it is a stored hash."""
+        h = self.refs().get(os.path.normpath(ref))
+        if h is not None:
+            return h
+        if re.fullmatch(r'[0-9a-f]{64}', ref) and os.path.exists(self._object_path(ref)):
+            return ref
+        raise KeyError(f'{ref} is not in the store at {self.path}')
+
+    def objects(self):
+        """Yield (hash, size) for every stored object."""
+        root = os.path.join(self.path, 'objects')
+        for sub in sorted(os.listdir(root)):
+            with os.scandir(os.path.join(root, sub)) as it:
+                for e in it:
+                    if e.is_file() and not e.name.endswith('.tmp'):
+                        yield e.name, e.stat().st_size
+
+    def usage(self):
+        """Return stored vs. rebuilt sizes: {'refs', 'objects', 'bytes', 'logical_bytes'}.
+
+        `logical_bytes` is the compact JSON size of every ref expanded, i.e.
+        what storing each file on its own would cost.
+        """
+        sizes = dict(self.objects())
+        logical = 0
+        refs = self.refs()
+        for h in refs.values():
+            image = self.get_object(h)
+            logical += sizes.get(h, 0)
+            for _, row in image['rows'] or ():
+                logical += sizes.get(row, 0)
+        return {'refs': len(refs), 'objects': len(sizes), 'bytes': sum(sizes.values()), 'logical_bytes': logical}
+
+    def gc(self):
+        """Remove objects no ref reaches; returns the number removed."""
+        live = set()
+        for h in self.refs().values():
+            live.add(h)
+            image = self.get_object(h)
+            live.update(row for _, row in image['rows'] or ())
+        removed = 0
+        for h, _ in list(self.objects()):
+            if h not in live:
+                os.remove(self._object_path(h))
+                removed += 1
+        return removed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Deduplicating store for pixel-code files')
+    parser.add_argument('--store', default=STORE_DIR, help=f'Store directory (default {STORE_DIR})')
+    sub = parser.add_subparsers(dest='command', required=True)
+    p = sub.add_parser('put', help='Add pixel-code files (stored under their paths)')
+    p.add_argument('files', nargs='+')
+    p = sub.add_parser('get', help='Rebuild a stored file')
+    p.add_argument('ref', help='Ref name or image hash')
+    p.add_argument('--output', '-o', help='Output path (default: the ref name)')
+    sub.add_parser('ls', help='List refs')
+    sub.add_parser('stats', help='Show stored vs. expanded size')
+    sub.add_parser('gc', help='Drop objects no ref uses')
+    args = parser.parse_args()
+
+    store = CodesStore(args.store)
+    if args.command == 'put':
+        for path in args.files:
+            print(f'{store.put_file(path)[:12]}  {path}')
+        print(f"{store.stats['written']} new objects, {store.stats['deduplicated']} already stored")
+    elif args.command == 'get':
+        try:
+            print(f'Wrote {store.write_file(args.ref, args.output or args.ref)}')
+        except KeyError as e:
+            print(f'Error: {e.args[0]}')
+            raise SystemExit(1)
+    elif args.command == 'ls':
+        for name, h in sorted(store.refs().items()):
+            print(f'{h[:12]}  {name}')
+    elif args.command == 'stats':
+        u = store.usage()
+        ratio = u['logical_bytes'] / u['bytes'] if u['bytes'] else 1.0
+        print(f"{u['refs']} refs, {u['objects']} objects, {u['bytes'] / 1024:.1f} KiB stored, "
+              f"{u['logical_bytes'] / 1024:.1f} KiB expanded ({ratio:.1f}x)")
+    elif args.command == 'gc':
+        print(f'Removed {store.gc()} unreferenced objects')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+codes_stream.py
+
+Row-at-a-time reading and writing of pixel-code files, so grids far past
+32 rows (e.g. 4096x4096 mosaics) never need the whole `rows` dict in
+memory.
+
+Two layouts are supported:
+
+  .json    the usual `{"rows": {"A": [...], ...}}`, written row by row in
+           the same indented form as `json.dump(..., indent=2)` and read
+           back with an incremental parser (other top-level keys, such as
+           "palette", are collected into `meta` as they are met).
+  .ndjson  one JSON object per line: `{"row": "A", "codes": [...]}`;
+           lines without "row" (e.g. `{"palette": [...]}`) go to `meta`.
+
+Row labels beyond the first 32 come from `pixel_codes.row_label`.
+
+Usage:
+  py -3 codes_stream.py big.json --to-ndjson big.ndjson
+  py -3 codes_stream.py big.ndjson --to-json big.json
+"""
+import argparse
+import json
+from itertools import chain
+
+READ_CHUNK = 1 << 16
+
+_decoder = json.JSONDecoder()
+
+
+def is_ndjson(path):
+    return path.lower().endswith(('.ndjson', '.jsonl'))
+
+
+def _json_row(label, codes):
+    if not codes:
+        return f'    {json.dumps(label)}: []'
+    # one C-encoder call per row; the item separator carries the indentation
+    items = json.dumps(codes, ensure_ascii=False, separators=(',\n      ', ': '))[1:-1]
+    return f'    {json.dumps(label)}: [\n      {items}\n    ]'
+
+
+def write_rows(path, rows, meta=None):
+    """Write (label, codes) pairs from the iterable `rows` as they come.
+
+    `meta` entries (e.g. {"palette": [...]}) are written before the rows.
+    Returns the number of rows written.
+    """
+    meta = meta or {}
+    n = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        if is_ndjson(path):
+            for key, value in meta.items():
+                f.write(json.dumps({key: value}, ensure_ascii=False, separators=(',', ':')) + '\n')
+            for label, codes in rows:
+                f.write(json.dumps({'row': label, 'codes': codes}, ensure_ascii=False, separators=(',', ':')) + '\n')
+                n += 1
+            return n
+        f.write('{\n')
+        for key, value in meta.items():
+            value = json.dumps(value, indent=2, ensure_ascii=False).replace('\n', '\n  ')
+            f.write(f'  {json.dumps(key)}: {value},\n')
+        f.write('  "rows": {')
+        for label, codes in rows:
+            f.write(',\n' if n else '\n')
+            f.write(_json_row(label, codes))
+            n += 1
+        f.write('\n  }\n}' if n else '}\n}')
+    return n
+
+
+class _Reader:
+    """Minimal pull parser over a text file: whitespace, punctuation and
+    whole JSON values (decoded with `raw_decode`), refilling the buffer as
+    needed."""
+
+    def __init__(self, f):
+        self.f = f
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self):
+        if self.eof:
+            return False
+        data = self.f.read(READ_CHUNK)
+        if not data:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + data
+        self.pos = 0
+        return True
+
+    def peek(self):
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in ' \t\r\n':
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ''
+
+    def take(self, allowed):
+        ch = self.peek()
+        if not ch or ch not in allowed:
+            raise ValueError(f'Expected one of {allowed!r} at offset {self.pos}, got {ch!r}')
+        self.pos += 1
+        return ch
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            # a number can run into the next chunk; make sure it really ended
+            if end == len(self.buf) and self._fill():
+                continue
+            self.pos = end
+            return value
+
+
+def _iter_json_rows(f, meta):
+    r = _Reader(f)
+    r.take('{')
+    if r.peek() == '}':
+        return
+    while True:
+        key = r.value()
+        r.take(':')
+        if key == 'rows' and r.peek() == '{':
+            r.take('{')
+            if r.peek() == '}':
+                r.take('}')
+            else:
+                while True:
+                    label = r.value()
+                    r.take(':')
+                    yield label, r.value()
+                    if r.take(',}') == '}':
+                        break
+        else:
+            meta[key] = r.value()
+        if r.take(',}') == '}':
+            return
+
+
+def _iter_ndjson_rows(f, meta):
+    for line in f:
+        if not line.strip():
+            continue
+        obj = json.loads(line)
+        if 'row' in obj:
+            yield obj['row'], obj.get('codes', [])
+        else:
+            meta.update(obj)
+
+
+def iter_rows(path, meta=None):
+    """Yield (label, codes) for every row of a .json or .ndjson file.
+
+    Only one row is decoded at a time. Other top-level data is stored in
+    the `meta` dict as it is read (a palette written before the rows is
+    therefore available while they are processed).
+    """
+    if meta is None:
+        meta = {}
+    with open(path, 'r', encoding='utf-8') as f:
+        if is_ndjson(path):
+            yield from _iter_ndjson_rows(f, meta)
+        else:
+            yield from _iter_json_rows(f, meta)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert pixel-code files between .json and .ndjson, row by row')
+    parser.add_argument('input', help='Pixel-code .json or .ndjson')
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument('--to-ndjson', metavar='PATH', help='Write line-delimited rows')
+    group.add_argument('--to-json', metavar='PATH', help='Write the indented JSON layout')
+    args = parser.parse_args()
+
+    output = args.to_ndjson or args.to_json
+    meta = {}
+    rows = iter_rows(args.input, meta)
+    # meta keys that precede the rows are known once the first row is read
+    first = next(rows, None)
+    n = write_rows(output, chain([first] if first is not None else [], rows), meta)
+    print(f'Wrote {n} rows to {output}')
+
+
+if __name__ == '__main__':
+    main()
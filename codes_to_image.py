@@ -5,8 +5,31 @@ codes_to_image.py
 Read a pixel-code JSON (same format produced by `image_to_codes.py`) and
 recreate the image (PNG) using a basic color palette mapping.
 
+Span codes such as `32A0-15_00E9FF` (written by `image_to_codes.py --rle`)
+fill columns 0..15 of row A with one colour.
+
+If the JSON has a top-level "palette" array (`image_to_codes.py --palette`),
+each code's colour part is an index into it and the image is built in
+P mode with `putpalette`.
+
+Animation JSON (`"format": "animation"`, written by `image_to_codes.py` for
+animated GIF/APNG input) is rebuilt by applying each frame's delta to the
+previous frame and saved as APNG, or as GIF when the output ends in .gif.
+
+Files over 16 MiB and .ndjson files (see `codes_stream.py`) are decoded
+one row at a time, so grids up to 4096x4096 (multi-letter row labels) keep
+Python memory flat apart from the image buffer itself.
+
+With --cache, renders are kept in an on-disk cache keyed by the content
+hash of the input (see `decode_cache.py`), so re-rendering an unchanged
+file is a copy.
+
+With --apply-delta, a delta from `codes_delta.py diff` is painted onto an
+existing PNG (--base) instead; only the pixels it lists are rewritten.
+
 Usage:
   py -3 codes_to_image.py as_pixels_codes_32x32.json --output recreated.png
+  py -3 codes_to_image.py --apply-delta edit.delta.json --base recreated.png
 
 """
 import argparse
@@ -14,53 +37,80 @@ import json
 import os
 from PIL import Image
 
-ROW_LABELS = [
-    *[chr(ord('A') + i) for i in range(26)],
-    'a', 'b', 'c', 'd', 'e', 'f'
-]
-
-BASE_BASIC_COLORS = {
-    'black': (0, 0, 0, 255),
-    'white': (255, 255, 255, 255),
-    'red': (255, 0, 0, 255),
-    'green': (0, 255, 0, 255),
-    'blue': (0, 0, 255, 255),
-    'yellow': (255, 255, 0, 255),
-    'magenta': (255, 0, 255, 255),
-    'cyan': (0, 255, 255, 255),
-    'gray': (128, 128, 128, 255),
-    'transparent': (0, 0, 0, 0),
-}
-
-
-def parse_code(code):
-    """Parse a single pixel code like '32A10white' into (size,row_label,col,color_name)."""
-    # read numeric size prefix
-    i = 0
-    while i < len(code) and code[i].isdigit():
-        i += 1
-    size = int(code[:i])
-    if i >= len(code):
-        raise ValueError(f"Invalid code: {code}")
-    row_label = code[i]
-    i += 1
-    # read column digits
-    j = i
-    while j < len(code) and code[j].isdigit():
-        j += 1
-    col = int(code[i:j])
-    color_name = code[j:]
-    # accept an optional leading underscore separating position and color
-    if color_name.startswith('_'):
-        color_name = color_name[1:]
-    return size, row_label, col, color_name
-
-
-def codes_json_to_image(input_path, output_path=None):
-    with open(input_path, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-
-    rows = data.get('rows')
+from decode_cache import CACHE_DIR, CACHE_MAX_BYTES, DecodeCache
+from phase_timing import add_profile_arguments, maybe_profiled, phase
+from codes_stream import is_ndjson, iter_rows
+from pixel_codes import UNKNOWN_COLOR, color_to_rgba_bytes, parse_code, parse_many, row_index
+
+# inputs larger than this (and all .ndjson) are decoded one row at a time
+STREAM_THRESHOLD = 16 * 1024 * 1024
+
+
+def default_output_path(input_path):
+    base = os.path.splitext(os.path.basename(input_path))[0]
+    return f"{base}.png"
+
+
+def fill_rows(rows, size, buf, bpp, palette=None, lookup=None):
+    """Write every row's codes into `buf` (size*size pixels, `bpp` bytes each).
+
+    Each code writes its RGBA bytes, or `lookup[rgba]` when a lookup table
+    is given. Rows with unknown labels and codes whose label disagrees with
+    their row are skipped; spans are clipped to the image and filled with
+    one slice write.
+    """
+    for row_label, codes in rows.items():
+        y = row_index(row_label)
+        if y is None:
+            continue
+        # parse even rows outside the image so malformed codes still fail
+        records = parse_many(codes, palette)
+        if y >= size:
+            continue
+        row_offset = y * size
+        for rec in records:
+            if rec.row != row_label:
+                # inconsistent label in this code; skip
+                continue
+            x = rec.col
+            n = min(rec.end, size - 1) - x + 1
+            if n > 0:
+                o = (row_offset + x) * bpp
+                value = rec.rgba if lookup is None else lookup[rec.rgba]
+                buf[o:o + bpp * n] = value * n
+
+
+def palette_rows_to_image(rows, palette, size):
+    """Build a P-mode image from palette-indexed rows.
+
+    Two extra entries are appended to the palette: transparent for pixels
+    without a code and magenta for out-of-range indexes. Returns None when
+    the palette does not fit in 256 entries.
+    """
+    if len(palette) > 254:
+        return None
+    entries = [color_to_rgba_bytes(c) for c in palette]
+    background = len(entries)
+    entries += [bytes(4), bytes(UNKNOWN_COLOR)]
+    # RGBA -> index byte; the first palette entry wins for repeated colours
+    lookup = {}
+    for i, rgba in enumerate(entries):
+        lookup.setdefault(rgba, bytes((i,)))
+
+    buf = bytearray([background]) * (size * size)
+    fill_rows(rows, size, buf, 1, palette, lookup)
+
+    img = Image.frombuffer('P', (size, size), buf, 'raw', 'P', 0, 1)
+    img.putpalette(b''.join(entries), rawmode='RGBA')
+    return img
+
+
+def rows_to_image(rows, palette=None):
+    """Build the image for a `rows` dict (optionally palette-indexed).
+
+    The size comes from the first code. Palette files produce a P-mode image
+    when the palette fits, otherwise the result is RGBA.
+    """
     if not rows:
         raise ValueError('JSON missing "rows" key')
 
@@ -68,75 +118,169 @@ def codes_json_to_image(input_path, output_path=None):
     first_row = next(iter(rows.values()))
     if not first_row:
         raise ValueError('No pixel codes found')
-    size, _, _, _ = parse_code(first_row[0])
+    size = parse_code(first_row[0]).size
 
-    img = Image.new('RGBA', (size, size), (0, 0, 0, 0))
-    px = img.load()
+    if palette is not None:
+        img = palette_rows_to_image(rows, palette, size)
+        if img is not None:
+            return img
+    # preallocated RGBA buffer, fully transparent
+    buf = bytearray(size * size * 4)
+    fill_rows(rows, size, buf, 4, palette)
+    return Image.frombuffer('RGBA', (size, size), buf, 'raw', 'RGBA', 0, 1)
 
-    for row_label, codes in rows.items():
-        if row_label not in ROW_LABELS:
+
+def animation_frames(data):
+    """Yield (RGBA image, duration) for every frame of an animation dict."""
+    frames = data.get('frames')
+    if not frames or 'rows' not in frames[0]:
+        raise ValueError('Animation has no keyframe')
+    size = data['size']
+    palette = data.get('palette')
+    img = rows_to_image(frames[0]['rows'], palette).convert('RGBA')
+    if img.size != (size, size):
+        raise ValueError(f'Keyframe is {img.width}x{img.height}, expected {size}x{size}')
+    yield img, frames[0].get('duration', 100)
+    for frame in frames[1:]:
+        img = img.copy()
+        if 'rows' in frame:
+            img = rows_to_image(frame['rows'], palette).convert('RGBA')
+        else:
+            apply_delta(img, dict(frame.get('delta', {}), size=size), palette)
+        yield img, frame.get('duration', 100)
+
+
+def save_animation(data, output_path):
+    """Rebuild an animation dict and save it as APNG (or GIF by extension)."""
+    with phase('decode'):
+        frames, durations = zip(*animation_frames(data))
+    with phase('save'):
+        options = {}
+        if output_path.lower().endswith('.gif'):
+            # full frames with transparency: clear each frame before drawing the next
+            options['disposal'] = 2
+        frames[0].save(output_path, save_all=True, append_images=list(frames[1:]),
+                       duration=list(durations), loop=data.get('loop', 0), **options)
+    return output_path
+
+
+def stream_codes_to_image(input_path, output_path):
+    """Render a large .json or .ndjson file one row at a time.
+
+    Only the current row's codes are in memory next to the RGBA buffer; the
+    size comes from the first code. Animation files fall back to
+    `save_animation`.
+    """
+    meta = {}
+    buf = None
+    with phase('decode'):
+        for row_label, codes in iter_rows(input_path, meta):
+            if not codes:
+                continue
+            if buf is None:
+                size = parse_code(codes[0]).size
+                buf = bytearray(size * size * 4)
+            fill_rows({row_label: codes}, size, buf, 4, meta.get('palette'))
+    if buf is None:
+        if meta.get('format') == 'animation':
+            return save_animation(meta, output_path)
+        raise ValueError('No pixel codes found')
+    img = Image.frombuffer('RGBA', (size, size), buf, 'raw', 'RGBA', 0, 1)
+    with phase('save'):
+        img.save(output_path)
+    return output_path
+
+
+def codes_json_to_image(input_path, output_path=None, cache=None):
+    """Render a pixel-code JSON file; returns the output path.
+
+    With a `decode_cache.DecodeCache`, an unchanged input (same bytes,
+    same output format) is copied from the cache instead of re-rendered;
+    formats the cache does not hold are always rendered.
+    """
+    if not output_path:
+        output_path = default_output_path(input_path)
+    if cache is not None and not cache.supports(output_path):
+        # the cache holds .png/.gif renders only
+        cache = None
+
+    if is_ndjson(input_path) or os.path.getsize(input_path) > STREAM_THRESHOLD:
+        if cache is not None:
+            with phase('load'):
+                key = cache.file_key(input_path, output_path)
+                if cache.fetch(key, output_path):
+                    return output_path
+        stream_codes_to_image(input_path, output_path)
+    else:
+        with phase('load'):
+            with open(input_path, 'rb') as f:
+                raw = f.read()
+            if cache is not None:
+                key = cache.key(raw, output_path)
+                if cache.fetch(key, output_path):
+                    return output_path
+            data = json.loads(raw.decode('utf-8'))
+
+        if data.get('format') == 'animation':
+            save_animation(data, output_path)
+        else:
+            with phase('decode'):
+                img = rows_to_image(data.get('rows'), data.get('palette'))
+            with phase('save'):
+                img.save(output_path)
+
+    if cache is not None:
+        with phase('cache'):
+            cache.store(key, output_path)
+    return output_path
+
+
+def apply_delta(img, delta, palette=None):
+    """Paint a `codes_delta` delta onto `img` (RGBA, modified in place).
+
+    Removed pixels become transparent; each changed code (span or single)
+    is written as one rectangle fill, so untouched pixels are never
+    rewritten. `palette` resolves index colours (animation frames).
+    """
+    size = delta.get('size')
+    if img.size != (size, size):
+        raise ValueError(f'Delta is for {size}x{size}, image is {img.width}x{img.height}')
+    for row_label, cols in delta.get('removed', {}).items():
+        y = row_index(row_label)
+        if y is None or y >= size:
             continue
-        y = ROW_LABELS.index(row_label)
-        for code in codes:
-            _, rlabel, col, color_name = parse_code(code)
-            if rlabel != row_label:
-                # inconsistent label in this code; skip
+        for x in cols:
+            img.paste((0, 0, 0, 0), (x, y, x + 1, y + 1))
+    for row_label, codes in delta.get('rows', {}).items():
+        y = row_index(row_label)
+        if y is None or y >= size:
+            continue
+        for rec in parse_many(codes, palette):
+            if rec.row != row_label or rec.col >= size:
                 continue
-            x = col
-            # Accept color as hex (RRGGBB or RRGGBBAA) with or without '#',
-            # otherwise fall back to named basic colors.
-            cn = str(color_name).strip()
-            def hex_to_rgba(s):
-                # Normalize and accept many common variants:
-                # - with or without '#'
-                # - 3-digit (#RGB) -> expand to RRGGBB
-                # - 4-digit (#RGBA) -> expand to RRGGBBAA
-                # - 6-digit (#RRGGBB)
-                # - 8-digit (#RRGGBBAA)
-                if not s:
-                    return None
-                raw = str(s).strip()
-                # keep only hex chars
-                import re
-                hexchars = re.sub(r'[^0-9A-Fa-f]', '', raw)
-                if len(hexchars) == 3:
-                    # e.g. '0FA' -> '00FFAA'
-                    r = int(hexchars[0] * 2, 16)
-                    g = int(hexchars[1] * 2, 16)
-                    b = int(hexchars[2] * 2, 16)
-                    return (r, g, b, 255)
-                if len(hexchars) == 4:
-                    r = int(hexchars[0] * 2, 16)
-                    g = int(hexchars[1] * 2, 16)
-                    b = int(hexchars[2] * 2, 16)
-                    a = int(hexchars[3] * 2, 16)
-                    return (r, g, b, a)
-                if len(hexchars) >= 6:
-                    # prefer first 6 or first 8 if available
-                    r = int(hexchars[0:2], 16)
-                    g = int(hexchars[2:4], 16)
-                    b = int(hexchars[4:6], 16)
-                    if len(hexchars) >= 8:
-                        a = int(hexchars[6:8], 16)
-                    else:
-                        a = 255
-                    return (r, g, b, a)
-                return None
-
-            rgba = hex_to_rgba(cn)
-            if rgba is None:
-                rgba = BASE_BASIC_COLORS.get(cn.lower())
-            if rgba is None:
-                # unknown name, default to magenta to highlight
-                rgba = (255, 0, 255, 255)
-            if 0 <= x < size and 0 <= y < size:
-                px[x, y] = rgba
+            img.paste(tuple(rec.rgba), (rec.col, y, min(rec.end, size - 1) + 1, y + 1))
+    return img
+
+
+def apply_delta_to_png(base_path, delta_path, output_path=None):
+    """Apply the delta at `delta_path` to the PNG at `base_path`.
+
+    Writes to `output_path`, or back over `base_path` when omitted.
+    """
+    with phase('load'), open(delta_path, 'r', encoding='utf-8') as f:
+        delta = json.load(f)
+
+    with phase('open'), Image.open(base_path) as src:
+        img = src.convert('RGBA') if src.mode != 'RGBA' else src.copy()
+
+    with phase('decode'):
+        apply_delta(img, delta)
 
     if not output_path:
-        base = os.path.splitext(os.path.basename(input_path))[0]
-        output_path = f"{base}.png"
+        output_path = base_path
 
-    img.save(output_path)
+    with phase('save'):
+        img.save(output_path)
     return output_path
 
 
@@ -146,7 +290,35 @@ def main():
     parser.add_argument('input', nargs='?', help='Path to pixel-code JSON')
     parser.add_argument('--gui', action='store_true', help='Open a file dialog to choose the JSON')
     parser.add_argument('--output', '-o', help='Output PNG path (optional)')
+    parser.add_argument('--batch', nargs='+', metavar='PATH', help='Render every JSON in these files, directories or globs (no dialogs)')
+    parser.add_argument('--workers', '-j', type=int, help='Batch worker processes (default: CPU count)')
+    parser.add_argument('--output-dir', help='Batch output directory (default: current directory)')
+    parser.add_argument('--manifest', help='Batch summary manifest path (default: <output-dir>/batch_manifest.json)')
+    parser.add_argument('--apply-delta', metavar='DELTA', help='Apply a codes_delta.py delta to the --base PNG')
+    parser.add_argument('--base', metavar='PNG', help='Existing PNG for --apply-delta (overwritten unless --output is given)')
+    parser.add_argument('--cache', nargs='?', const=CACHE_DIR, metavar='DIR',
+                        help=f'Reuse renders from a content-hash cache (default dir {CACHE_DIR})')
+    parser.add_argument('--cache-max-mb', type=float, default=CACHE_MAX_BYTES / 2**20,
+                        help=f'Cache size bound in MiB; least recently used renders are evicted (default {CACHE_MAX_BYTES // 2**20})')
+    add_profile_arguments(parser, 'codes_to_image')
     args = parser.parse_args()
+    cache_max_bytes = int(args.cache_max_mb * 2**20)
+
+    if args.apply_delta:
+        if not args.base:
+            parser.error('--apply-delta requires --base')
+        with maybe_profiled(args.profile, 'codes_to_image', args.cprofile):
+            out = apply_delta_to_png(args.base, args.apply_delta, args.output)
+        print(f'Wrote image: {out}')
+        return
+
+    if args.batch:
+        from batch_convert import run_batch
+        manifest = run_batch('codes_to_image', args.batch, output_dir=args.output_dir, workers=args.workers,
+                             manifest_path=args.manifest, cache_dir=args.cache, cache_max_bytes=cache_max_bytes)
+        if manifest['failed']:
+            raise SystemExit(1)
+        return
 
     input_path = args.input
     if not input_path or args.gui:
@@ -169,8 +341,14 @@ def main():
         print("\nNo input JSON selected. Exiting.")
         return
 
-    out = codes_json_to_image(input_path, args.output)
+    cache = DecodeCache(args.cache, cache_max_bytes) if args.cache else None
+    with maybe_profiled(args.profile, 'codes_to_image', args.cprofile):
+        out = codes_json_to_image(input_path, args.output, cache)
     print(f'Wrote image: {out}')
+    if cache is not None:
+        usage = cache.usage()
+        print(f"Cache {'hit' if cache.stats['hits'] else 'miss'} ({usage['entries']} entries, "
+              f"{usage['bytes'] / 1024:.1f} KiB in {args.cache})")
 
 
 if __name__ == '__main__':
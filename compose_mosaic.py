@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+compose_mosaic.py
+
+Build one large PNG from many pixel-code tiles described by a layout
+manifest, without rendering each tile to its own PNG first and without
+ever holding the whole canvas.
+
+The canvas is produced band by band: the tiles that touch the current band
+are decoded on a process pool (`codes_to_image.rows_to_image`), pasted
+into a band-sized buffer, and the band's scanlines are compressed straight
+into the PNG's IDAT stream. Peak memory is one band of pixels plus the
+tiles overlapping it.
+
+Layout manifest, grid form (paths relative to the manifest, null = empty):
+  {"tile_size": 32, "columns": 100, "tiles": ["a.json", "b.json", null, ...]}
+
+or explicit placement (pixel coordinates):
+  {"width": 3200, "height": 640,
+   "tiles": [{"path": "a.json", "x": 0, "y": 0}, ...]}
+
+Usage:
+  py -3 compose_mosaic.py layout.json --output mosaic.png --workers 8
+"""
+import argparse
+import json
+import os
+import struct
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image
+
+from codes_to_image import rows_to_image
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+# flush compressed scanlines to an IDAT chunk once this much is pending
+IDAT_CHUNK = 1 << 20
+
+
+class PngStreamWriter:
+    """Write an RGBA PNG scanline band by scanline band."""
+
+    def __init__(self, path, width, height, level=6):
+        self.f = open(path, 'wb')
+        self.width = width
+        self.height = height
+        self.rows_written = 0
+        self.z = zlib.compressobj(level)
+        self.pending = []
+        self.pending_len = 0
+        self.f.write(PNG_SIGNATURE)
+        # 8-bit RGBA, no interlace
+        self._chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0))
+
+    def _chunk(self, kind, data):
+        self.f.write(struct.pack('>I', len(data)))
+        self.f.write(kind)
+        self.f.write(data)
+        self.f.write(struct.pack('>I', zlib.crc32(data, zlib.crc32(kind))))
+
+    def _queue(self, data):
+        if data:
+            self.pending.append(data)
+            self.pending_len += len(data)
+        if self.pending_len >= IDAT_CHUNK:
+            self._chunk(b'IDAT', b''.join(self.pending))
+            self.pending = []
+            self.pending_len = 0
+
+    def write_rows(self, data):
+        """Append whole RGBA scanlines (`data` is rows * width * 4 bytes)."""
+        stride = self.width * 4
+        n = len(data) // stride
+        if self.rows_written + n > self.height:
+            raise ValueError('More rows than the image height')
+        # filter type 0 (None) before every scanline
+        lines = bytearray()
+        for i in range(n):
+            lines.append(0)
+            lines += data[i * stride:(i + 1) * stride]
+        self._queue(self.z.compress(bytes(lines)))
+        self.rows_written += n
+
+    def close(self):
+        if self.rows_written != self.height:
+            raise ValueError(f'Wrote {self.rows_written} of {self.height} rows')
+        self._queue(self.z.flush())
+        if self.pending:
+            self._chunk(b'IDAT', b''.join(self.pending))
+        self._chunk(b'IEND', b'')
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.close()
+        else:
+            self.f.close()
+        return False
+
+
+def load_layout(path):
+    """Read a layout manifest; returns (width, height, band, placements).
+
+    `placements` is a list of (tile path, x, y) sorted by y; `band` is the
+    default band height (the tile size for grid layouts). Null tiles are
+    skipped; a malformed layout raises ValueError.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        layout = json.load(f)
+    base = os.path.dirname(os.path.abspath(path))
+    tiles = layout.get('tiles') or []
+    placements = []
+    if tiles and isinstance(next((t for t in tiles if t is not None), None), dict):
+        if 'width' not in layout or 'height' not in layout:
+            raise ValueError(f'{path}: explicit layouts need "width" and "height"')
+        width, height = int(layout['width']), int(layout['height'])
+        band = layout.get('tile_size', 32)
+        for i, t in enumerate(tiles):
+            if t is None:
+                continue
+            if not isinstance(t, dict) or any(k not in t for k in ('path', 'x', 'y')):
+                raise ValueError(f'{path}: tile {i} needs "path", "x" and "y"')
+            placements.append((os.path.join(base, t['path']), int(t['x']), int(t['y'])))
+    else:
+        size = layout.get('tile_size', 32)
+        columns = layout.get('columns') or max(1, len(tiles))
+        width = columns * size
+        height = -(-len(tiles) // columns) * size
+        band = size
+        for i, t in enumerate(tiles):
+            if t is not None:
+                placements.append((os.path.join(base, t), (i % columns) * size, (i // columns) * size))
+    placements.sort(key=lambda p: (p[2], p[1]))
+    return width, height, band, placements
+
+
+def _decode_tile(path):
+    """Worker: decode one tile; returns (path, (w, h, RGBA bytes) or None, error)."""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        img = rows_to_image(data.get('rows'), data.get('palette')).convert('RGBA')
+        return path, (img.width, img.height, img.tobytes()), None
+    except (OSError, ValueError) as e:
+        return path, None, f'{type(e).__name__}: {e}'
+
+
+def compose_mosaic(layout_path, output_path='mosaic.png', workers=None, band_height=None, progress=print):
+    """Compose the mosaic described by `layout_path` into `output_path`.
+
+    `progress` is called with one line per band (None to stay quiet).
+    Returns a summary dict (output, width, height, bands, errors, seconds).
+    """
+    start = time.perf_counter()
+    width, height, band, placements = load_layout(layout_path)
+    band = band_height or band
+    if width <= 0 or height <= 0:
+        raise ValueError('Layout has no tiles')
+    workers = workers or os.cpu_count() or 1
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+
+    errors = {}
+    live = []  # (x, y, (w, h, data)) of decoded tiles reaching past the current band
+    next_tile = 0
+    bands = -(-height // band)
+    try:
+        with PngStreamWriter(output_path, width, height) as png:
+            for b in range(bands):
+                t0 = time.perf_counter()
+                top = b * band
+                bottom = min(top + band, height)
+                # decode the tiles that start in this band
+                first = next_tile
+                while next_tile < len(placements) and placements[next_tile][2] < bottom:
+                    next_tile += 1
+                new = placements[first:next_tile]
+                todo = sorted({path for path, _, _ in new})
+                if pool is not None and len(todo) > 1:
+                    results = pool.map(_decode_tile, todo, chunksize=max(1, len(todo) // (workers * 4)))
+                else:
+                    results = map(_decode_tile, todo)
+                tiles = {}
+                for path, tile, error in results:
+                    if error is not None:
+                        errors[path] = error
+                    else:
+                        tiles[path] = tile
+                live.extend((x, y, tiles[path]) for path, x, y in new if path in tiles)
+
+                canvas = Image.new('RGBA', (width, bottom - top), (0, 0, 0, 0))
+                for x, y, (w, h, data) in live:
+                    canvas.paste(Image.frombytes('RGBA', (w, h), data), (x, y - top))
+                png.write_rows(canvas.tobytes())
+                pasted = len(live)
+                del canvas, tiles
+                # keep only tiles that continue into the next band
+                live = [t for t in live if t[1] + t[2][1] > bottom]
+                if progress:
+                    progress(f'[band {b + 1}/{bands}] rows {top}-{bottom - 1}: {pasted} tiles '
+                             f'({time.perf_counter() - t0:.3f}s)')
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    return {
+        'output': output_path,
+        'width': width,
+        'height': height,
+        'bands': bands,
+        'errors': errors,
+        'seconds': round(time.perf_counter() - start, 6),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compose many pixel-code tiles into one PNG, band by band')
+    parser.add_argument('layout', help='Layout manifest JSON')
+    parser.add_argument('--output', '-o', default='mosaic.png', help='Output PNG path (default mosaic.png)')
+    parser.add_argument('--workers', '-j', type=int, help='Tile decoder processes (default: CPU count)')
+    parser.add_argument('--band-height', type=int, help='Pixel rows per band (default: the tile size)')
+    args = parser.parse_args()
+
+    try:
+        summary = compose_mosaic(args.layout, args.output, args.workers, args.band_height)
+    except ValueError as e:
+        print(f'Error: {e}')
+        raise SystemExit(1)
+    print(f"Wrote {summary['output']} ({summary['width']}x{summary['height']}, {summary['bands']} bands) "
+          f"in {summary['seconds']:.2f}s")
+    for path, msg in summary['errors'].items():
+        print(f'  skipped {path}: {msg}')
+    if summary['errors']:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
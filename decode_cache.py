@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+decode_cache.py
+
+On-disk cache of rendered images for `codes_to_image.py`. Entries are keyed
+by the SHA-256 of the input JSON bytes plus the render options (output
+format and a cache version), so editing a file in place simply misses and
+re-renders; nothing is keyed by path or mtime.
+
+Each entry is the final encoded image (`<key>.png` / `<key>.gif`); renders
+to any other format bypass the cache. A hit
+copies it to the output path. The cache is bounded by total size: hits
+refresh an entry's mtime and the least recently used entries are evicted
+once the bound is exceeded. Writes go through a temp file and
+`os.replace`, so parallel batch workers can share one cache directory.
+
+Usage:
+  py -3 codes_to_image.py sprite.json --cache
+  py -3 codes_to_image.py --batch codes/ --cache .codes_cache --cache-max-mb 64
+  py -3 decode_cache.py [.codes_cache] [--clear]
+"""
+import argparse
+import hashlib
+import os
+import shutil
+import tempfile
+
+CACHE_DIR = '.codes_cache'
+CACHE_MAX_BYTES = 256 * 1024 * 1024
+# bump when the decoder output changes so stale renders are not served
+CACHE_VERSION = 1
+CACHE_EXTS = ('.png', '.gif')
+
+
+class DecodeCache:
+    """Size-bounded LRU cache of rendered images in `path`.
+
+    `stats` counts hits, misses, stores and evictions for this instance.
+    """
+
+    def __init__(self, path=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.stats = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+        os.makedirs(path, exist_ok=True)
+
+    def key(self, raw, output_path):
+        """Cache key for input JSON bytes rendered to `output_path`'s format.
+
+        Only meaningful for formats that `supports` accepts.
+        """
+        ext = self._ext(output_path)
+        h = hashlib.sha256(raw)
+        h.update(f'\0v{CACHE_VERSION}{ext}'.encode('ascii'))
+        return h.hexdigest() + ext
+
+    def file_key(self, input_path, output_path):
+        """Like `key`, reading the input in chunks instead of all at once."""
+        ext = self._ext(output_path)
+        h = hashlib.sha256()
+        with open(input_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                h.update(chunk)
+        h.update(f'\0v{CACHE_VERSION}{ext}'.encode('ascii'))
+        return h.hexdigest() + ext
+
+    @staticmethod
+    def _ext(output_path):
+        return os.path.splitext(output_path)[1].lower()
+
+    @classmethod
+    def supports(cls, output_path):
+        """Whether renders to `output_path`'s format are cached (CACHE_EXTS)."""
+        return cls._ext(output_path) in CACHE_EXTS
+
+    def fetch(self, key, output_path):
+        """Copy the entry for `key` to `output_path`; returns True on a hit."""
+        entry = os.path.join(self.path, key)
+        try:
+            shutil.copyfile(entry, output_path)
+        except FileNotFoundError:
+            self.stats['misses'] += 1
+            return False
+        try:
+            os.utime(entry)
+        except FileNotFoundError:
+            # evicted by another process after the copy; the copy is still good
+            pass
+        self.stats['hits'] += 1
+        return True
+
+    def store(self, key, image_path):
+        """Add the rendered file at `image_path` under `key`, then evict."""
+        fd, tmp = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+        os.close(fd)
+        try:
+            shutil.copyfile(image_path, tmp)
+            os.replace(tmp, os.path.join(self.path, key))
+        except BaseException:
+            os.remove(tmp)
+            raise
+        self.stats['stores'] += 1
+        self.evict()
+
+    def entries(self):
+        """List (mtime, size, path) for every cache entry, oldest first."""
+        found = []
+        with os.scandir(self.path) as it:
+            for e in it:
+                if e.is_file() and e.name.endswith(CACHE_EXTS):
+                    try:
+                        st = e.stat()
+                    except FileNotFoundError:
+                        continue
+                    found.append((st.st_mtime, st.st_size, e.path))
+        found.sort()
+        return found
+
+    def evict(self):
+        """Drop least recently used entries until the cache fits `max_bytes`."""
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                self.stats['evictions'] += 1
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def usage(self):
+        """Return {'entries': n, 'bytes': total} for the cache directory."""
+        entries = self.entries()
+        return {'entries': len(entries), 'bytes': sum(size for _, size, _ in entries)}
+
+    def clear(self):
+        for _, _, path in self.entries():
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Show or clear the codes_to_image decode cache')
+    parser.add_argument('path', nargs='?', default=CACHE_DIR, help=f'Cache directory (default {CACHE_DIR})')
+    parser.add_argument('--clear', action='store_true', help='Remove every cached render')
+    args = parser.parse_args()
+
+    cache = DecodeCache(args.path)
+    if args.clear:
+        cache.clear()
+    usage = cache.usage()
+    print(f"{args.path}: {usage['entries']} entries, {usage['bytes'] / 1024:.1f} KiB")
+
+
+if __name__ == '__main__':
+    main()
@@ -4,68 +4,143 @@ extract_codes.py
 
 Read a pixel-code JSON like `as_pixels_codes_32x32.json` and write
 an extracted JSON containing a flat `codes` array and a `map` of
-code => { size, row, col, color }.
+code => { size, row, col, color }. Span codes like `32A0-15_00E9FF`
+(from `image_to_codes.py --rle`) are expanded into one code per pixel, and
+palette-indexed files (`--palette`) are resolved back to hex colours.
+
+With --columnar the output instead holds parallel `rows`/`cols`/`colors`
+arrays (row-label and colour-palette indexes) plus `row_labels` and
+`palette` tables, written compactly; --index color/row adds prebuilt
+lookups so "all pixels of colour X" needs no scan.
 
 Usage:
   py -3 extract_codes.py as_pixels_codes_32x32.json
+  py -3 extract_codes.py as_pixels_codes_32x32.json --columnar --index color row
 
 """
 import argparse
 import json
 import os
-import re
-
-ROW_LABELS = [chr(ord('A')+i) for i in range(26)] + list('abcdef')
-
-CODE_RE = re.compile(r"^\s*(\d+)([A-Za-z])(\d+)_?([A-Za-z0-9#]+)\s*$")
-
-
-def parse_code(code):
-    m = CODE_RE.match(code)
-    if not m:
-        return None
-    size = int(m.group(1))
-    row = m.group(2)
-    col = int(m.group(3))
-    color = m.group(4)
-    return {
-        'size': size,
-        'row': row,
-        'col': col,
-        'color': color,
-    }
 
+from phase_timing import add_profile_arguments, maybe_profiled, phase
+from pixel_codes import ROW_INDEX, ROW_LABELS, parse_many
+
+
+def expand_row(row_codes, palette=None):
+    """Yield (code, info) for every pixel described by a row's codes.
 
-def extract(input_path, output_path=None):
-    with open(input_path, 'r', encoding='utf-8') as f:
+    Span codes are expanded into per-pixel codes and palette indexes are
+    replaced by palette colours; other codes pass through unchanged.
+    `info` is None for malformed codes.
+    """
+    for code, rec in zip(row_codes, parse_many(row_codes, palette, strict=False)):
+        if rec is None:
+            yield code, None
+        elif not rec.is_span and palette is None:
+            yield code, rec.as_dict()
+        else:
+            prefix = f"{rec.size}{rec.row}"
+            for x in range(rec.col, rec.end + 1):
+                yield f"{prefix}{x}_{rec.color}", {'size': rec.size, 'row': rec.row, 'col': x, 'color': rec.color}
+
+
+def ordered_rows(rows):
+    """Rows in ROW_LABELS order where present, then the rest in dict order."""
+    for r in ROW_LABELS:
+        if r in rows:
+            yield r, rows[r]
+    for r, row_codes in rows.items():
+        if r not in ROW_INDEX:
+            yield r, row_codes
+
+
+def columnar(rows, palette=None, index=()):
+    """Build the columnar form of `rows`.
+
+    Every pixel is one position in the parallel `rows`, `cols` and `colors`
+    arrays; `rows` and `colors` index into `row_labels` and `palette`.
+    Malformed codes are listed under `invalid`. `index` may contain
+    'color' (palette index -> positions) and/or 'row' (row label ->
+    [start, stop) position ranges).
+    """
+    row_ids = {}
+    color_ids = {}
+    sizes = set()
+    row_col, col_col, color_col = [], [], []
+    invalid = []
+    for _, row_codes in ordered_rows(rows):
+        for code, info in expand_row(row_codes, palette):
+            if info is None:
+                invalid.append(code)
+                continue
+            sizes.add(info['size'])
+            row_col.append(row_ids.setdefault(info['row'], len(row_ids)))
+            col_col.append(info['col'])
+            color_col.append(color_ids.setdefault(info['color'], len(color_ids)))
+
+    out = {
+        'format': 'columnar',
+        'count': len(col_col),
+        'size': sizes.pop() if len(sizes) == 1 else sorted(sizes),
+        'row_labels': list(row_ids),
+        'palette': list(color_ids),
+        'rows': row_col,
+        'cols': col_col,
+        'colors': color_col,
+    }
+    if invalid:
+        out['invalid'] = invalid
+
+    indexes = {}
+    if 'color' in index:
+        by_color = {}
+        for i, c in enumerate(color_col):
+            by_color.setdefault(c, []).append(i)
+        indexes['color'] = {str(c): positions for c, positions in sorted(by_color.items())}
+    if 'row' in index:
+        by_row = {}
+        for i, r in enumerate(row_col):
+            runs = by_row.setdefault(out['row_labels'][r], [])
+            if runs and runs[-1][1] == i:
+                runs[-1][1] = i + 1
+            else:
+                runs.append([i, i + 1])
+        indexes['row'] = by_row
+    if indexes:
+        out['index'] = indexes
+    return out
+
+
+def extract(input_path, output_path=None, columnar_output=False, index=()):
+    with phase('load'), open(input_path, 'r', encoding='utf-8') as f:
         data = json.load(f)
 
     rows = data.get('rows')
     if not rows or not isinstance(rows, dict):
         raise ValueError("Input JSON must contain a top-level 'rows' object")
+    palette = data.get('palette')
+
+    if not output_path:
+        base = os.path.splitext(os.path.basename(input_path))[0]
+        output_path = f"{base}_codes.json"
+
+    if columnar_output:
+        out = {'source': os.path.basename(input_path)}
+        with phase('extract'):
+            out.update(columnar(rows, palette, index))
+        with phase('write'), open(output_path, 'w', encoding='utf-8') as f:
+            json.dump(out, f, separators=(',', ':'), ensure_ascii=False)
+        return output_path
 
     codes = []
     mapping = {}
 
     # iterate rows in ROW_LABELS order where present, otherwise in dict order
-    seen = set()
-    for r in ROW_LABELS:
-        if r in rows:
-            row_codes = rows[r]
-            for c in row_codes:
+    with phase('extract'):
+        for _, row_codes in ordered_rows(rows):
+            for c, parsed in expand_row(row_codes, palette):
                 codes.append(c)
-                parsed = parse_code(c)
                 mapping[c] = parsed
-            seen.add(r)
-
-    # add any remaining rows that were not in ROW_LABELS
-    for r, row_codes in rows.items():
-        if r in seen:
-            continue
-        for c in row_codes:
-            codes.append(c)
-            parsed = parse_code(c)
-            mapping[c] = parsed
 
     out = {
         'source': os.path.basename(input_path),
@@ -74,11 +149,7 @@ def extract(input_path, output_path=None):
         'map': mapping,
     }
 
-    if not output_path:
-        base = os.path.splitext(os.path.basename(input_path))[0]
-        output_path = f"{base}_codes.json"
-
-    with open(output_path, 'w', encoding='utf-8') as f:
+    with phase('write'), open(output_path, 'w', encoding='utf-8') as f:
         json.dump(out, f, indent=2, ensure_ascii=False)
 
     return output_path
@@ -88,9 +159,13 @@ def main():
     parser = argparse.ArgumentParser(description='Extract codes from pixel-code JSON into a separate JSON')
     parser.add_argument('input', help='Path to pixel-code JSON')
     parser.add_argument('--output', '-o', help='Output JSON path (optional)')
+    parser.add_argument('--columnar', action='store_true', help='Write parallel row/col/colour arrays with a palette instead of codes + map')
+    parser.add_argument('--index', nargs='+', choices=['color', 'row'], default=[], help='With --columnar, add prebuilt lookups by colour and/or row')
+    add_profile_arguments(parser, 'extract_codes')
     args = parser.parse_args()
 
-    out = extract(args.input, args.output)
+    with maybe_profiled(args.profile, 'extract_codes', args.cprofile):
+        out = extract(args.input, args.output, columnar_output=args.columnar, index=args.index)
     print(f'Wrote extracted codes JSON: {out}')
 
 if __name__ == '__main__':
@@ -6,29 +6,35 @@ Generate `codes.json` mapping 31 secret codes to each row of
 `as_pixels_codes_32x32.json` and a master code `REVEAL_ALL` that contains
 all codes in row-major order.
 
+`REVEAL_ALL` is written as references to the row keys (see `codes_map.py`);
+pass --legacy-reveal-all to write the full flattened copy instead.
+--shards DIR also writes per-key shards for the page (see
+`build_code_shards.py`); --index keeps `codes_index.py`'s reverse-lookup
+index in step. --store reads the rows from a `codes_store.py`
+store (as written by `image_to_codes.py --store`) instead of the file.
+
 Usage:
-  py -3 generate_codes_json.py
+  py -3 generate_codes_json.py [--legacy-reveal-all] [--shards codes] [--index] [--store [DIR]]
 
 This writes `codes.json` into the same folder.
 """
+import argparse
 import json
 import os
 
+from codes_index import INDEX_PATH
+from codes_map import REVEAL_ALL, LazyCodesMap, refs_for, resolve, write_codes
+from codes_store import STORE_DIR, CodesStore
+from pixel_codes import CODE_RE
+
 INPUT = 'as_pixels_codes_32x32.json'
 OUTPUT = 'codes.json'
 
 ROW_LABELS = [chr(ord('A')+i) for i in range(26)] + list('abcdef')
 
-if __name__ == '__main__':
-    if not os.path.exists(INPUT):
-        print(f'Error: {INPUT} not found in current directory')
-        raise SystemExit(1)
-
-    with open(INPUT, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-
-    rows = data.get('rows', {})
 
+def build_codes_map(rows):
+    """Map the 31 ROW_* keys to their rows and add REVEAL_ALL as references."""
     codes_map = {}
 
     # create 31 row codes: use rows A..Z and a..e (31 rows)
@@ -47,9 +53,105 @@ if __name__ == '__main__':
         arr = rows.get(r)
         if arr:
             flat.extend(arr)
-    codes_map['REVEAL_ALL'] = flat
+    codes_map[REVEAL_ALL] = refs_for(codes_map, flat) or []
+    return codes_map
+
+
+def rows_from_codes_map(codes_map):
+    """Recover the rows an existing map was built from, grouped by the
+    codes' row labels (from REVEAL_ALL, or the key lists without it)."""
+    rows = {}
+    if REVEAL_ALL in codes_map:
+        for code in resolve(codes_map, REVEAL_ALL):
+            m = CODE_RE.match(code)
+            if m:
+                rows.setdefault(m.group(2), []).append(code)
+        return rows
+    for key, value in codes_map.items():
+        m = CODE_RE.match(value[0]) if isinstance(value, list) and value else None
+        if m:
+            rows.setdefault(m.group(2), value)
+    return rows
+
+
+def update_codes_map(codes_map, old_rows, new_rows):
+    """Patch `codes_map` in place for the rows that differ between
+    `old_rows` and `new_rows`; returns the list of keys rewritten.
+
+    Each changed row is found by content, so keys renamed by the remap
+    scripts are updated too; a row no key holds yet falls back to its
+    ROW_* key when the map has it. REVEAL_ALL is rebuilt from the new rows
+    in the form it already has (references or a legacy flat list).
+    """
+    changed = [r for r in ROW_LABELS if old_rows.get(r) != new_rows.get(r)]
+    if not changed:
+        return []
+
+    holders = {}
+    for key, value in codes_map.items():
+        if key != REVEAL_ALL and isinstance(value, list) and value:
+            holders.setdefault(value[0], []).append(key)
+    row_keys = {}
+    for r in ROW_LABELS[:31]:
+        row_keys[f'ROW_{r.upper()}'] = r
+
+    updated = []
+    for r in changed:
+        old = old_rows.get(r) or []
+        keys = [k for k in holders.get(old[0], ()) if codes_map[k] == old] if old else []
+        if not keys:
+            keys = [k for k, label in row_keys.items() if label == r and k in codes_map]
+        for key in keys:
+            codes_map[key] = new_rows.get(r, [])
+            updated.append(key)
+
+    flat = []
+    for r in ROW_LABELS:
+        arr = new_rows.get(r)
+        if arr:
+            flat.extend(arr)
+    if isinstance(codes_map.get(REVEAL_ALL), list):
+        codes_map[REVEAL_ALL] = flat
+    else:
+        codes_map[REVEAL_ALL] = refs_for(codes_map, flat) or []
+    updated.append(REVEAL_ALL)
+    return updated
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate codes.json from the pixel-code rows')
+    parser.add_argument('--legacy-reveal-all', action='store_true', help='Write REVEAL_ALL as a full flattened copy of every row')
+    parser.add_argument('--shards', metavar='DIR', help='Also write per-key SHA-256 shards to DIR')
+    parser.add_argument('--index', nargs='?', const=INDEX_PATH, metavar='PATH', help=f'Also update the reverse-lookup index (default {INDEX_PATH})')
+    parser.add_argument('--store', nargs='?', const=STORE_DIR, metavar='DIR', help=f'Read {INPUT} from a codes_store (default {STORE_DIR})')
+    args = parser.parse_args()
 
-    with open(OUTPUT, 'w', encoding='utf-8') as f:
-        json.dump(codes_map, f, indent=2, ensure_ascii=False)
+    if args.store:
+        try:
+            data = CodesStore(args.store).read_data(INPUT)
+        except KeyError as e:
+            print(f'Error: {e.args[0]}')
+            raise SystemExit(1)
+    else:
+        if not os.path.exists(INPUT):
+            print(f'Error: {INPUT} not found in current directory')
+            raise SystemExit(1)
+
+        with open(INPUT, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+
+    codes_map = build_codes_map(data.get('rows', {}))
+
+    refreshed = write_codes(OUTPUT, codes_map, legacy=args.legacy_reveal_all)
+    if args.shards and not (refreshed and os.path.abspath(refreshed) == os.path.abspath(args.shards)):
+        from build_code_shards import write_shards
+        write_shards(LazyCodesMap(codes_map), args.shards)
+    if args.index:
+        from codes_index import update_index
+        update_index(args.index, codes_map)
 
     print(f'Wrote {OUTPUT} with {len(codes_map)} keys (including REVEAL_ALL)')
+
+
+if __name__ == '__main__':
+    main()
@@ -8,6 +8,31 @@ the project's pixel-code format: <size><Row><Col><HexColor>
 Example code for a pixel at row 'H', column 11 with RGB red 255,0,0:
   32H11FF0000
 
+With --rle, runs of same-colour pixels in a row collapse into one span
+code <size><Row><Start>-<End>_<HexColor>, e.g. 32A0-15_00E9FF.
+
+With --palette, the output gains a top-level "palette" array of hex colours
+and each code's colour part is an index into it, e.g. 32A0_0.
+
+Animated GIF/APNG input is encoded frame by frame: the first frame is a
+keyframe with full "rows", every later frame only a "delta" of the pixels
+that changed since the previous one (see `codes_delta.py`). Frames are
+written as they are encoded, so only the previous frame is kept in memory:
+  { "format": "animation", "size": 32, "loop": 0,
+    "frames": [ {"duration": 100, "rows": {...}},
+                {"duration": 100, "delta": {"rows": {"H": ["32H3-5_FF0000"]}}} ] }
+--first-frame keeps the old behaviour of encoding only the first frame.
+
+--colors N reduces a still image to at most N RGB colours after resizing
+and before encoding (--quantize median/kmeans/octree, or --fixed-palette
+basic to snap to the basic colours); see `quantize_colors.py`. Alpha is
+kept, so partly transparent pixels can add RGBA variants of those colours.
+
+Sizes above 32 use multi-letter row labels after `f` (AA, AB, ...; see
+`pixel_codes.row_label`) and are streamed to the output a band of rows at
+a time, as is any .ndjson output (one `{"row": ..., "codes": [...]}` per
+line; see `codes_stream.py`).
+
 Output JSON structure matches existing `pixels.json` style:
   { "rows": { "A": ["32A0FF0000", ...], ... } }
 
@@ -19,7 +44,18 @@ Requires: Pillow (pip install pillow)
 import argparse
 import json
 import os
-from PIL import Image
+from itertools import groupby
+from PIL import Image, ImageSequence
+
+from codes_delta import changed_codes
+from codes_store import STORE_DIR, CodesStore
+from codes_stream import is_ndjson, write_rows
+from phase_timing import add_profile_arguments, maybe_profiled, phase
+from pixel_codes import ROW_LABELS, row_label
+from quantize_colors import PALETTE_CACHE_DIR, QUANTIZE_METHODS, PaletteCache, quantize_image
+
+# rows of pixels pulled per step by the streaming encoder
+STREAM_BAND = 64
 
 
 def recommend_size_from_image(img):
@@ -36,14 +72,6 @@ def recommend_size_from_image(img):
     return min(allowed, key=lambda s: abs(s - target))
 
 
-ROW_LABELS = [
-    # 26 uppercase A-Z
-    *[chr(ord('A') + i) for i in range(26)],
-    # then lowercase a-f to get up to 32 rows total
-    'a', 'b', 'c', 'd', 'e', 'f'
-]
-
-
 def color_to_hex(r, g, b, a=None):
     # legacy function kept for compatibility but not used
     if a is None or a == 255:
@@ -62,33 +90,245 @@ def color_to_hex(r, g, b, a=None):
 # simplified names.
 
 
-def image_to_codes(path, size=32, output_path=None, resize=True):
-    img = Image.open(path).convert('RGBA')
+def run_length_codes(prefix, hexes):
+    """Collapse a row's per-pixel hex colours into span codes.
+
+    Runs of two or more equal colours become `<prefix><start>-<end>_<hex>`;
+    single pixels keep the plain `<prefix><col>_<hex>` form.
+    """
+    codes = []
+    x = 0
+    for hexcol, run in groupby(hexes):
+        n = sum(1 for _ in run)
+        if n == 1:
+            codes.append(f"{prefix}{x}_{hexcol}")
+        else:
+            codes.append(f"{prefix}{x}-{x + n - 1}_{hexcol}")
+        x += n
+    return codes
+
+
+def _encode_line(line, prefix, cols, rle, palette):
+    """Codes for one row given its RRGGBBAA hex string (see `encode_rows`)."""
+    stride = len(line)
+    if rle or palette is not None:
+        hexes = [line[i:i + 6] if line[i + 6:i + 8] == 'FF' else line[i:i + 8]
+                 for i in range(0, stride, 8)]
+        if palette is not None:
+            # index strings are truthy, so setdefault only runs for new colours
+            hexes = [palette.get(hexcol) or palette.setdefault(hexcol, str(len(palette)))
+                     for hexcol in hexes]
+        if rle:
+            return run_length_codes(prefix, hexes)
+        return [prefix + cols[x] + hexcol for x, hexcol in enumerate(hexes)]
+    return [
+        prefix + cols[x] + (line[i:i + 6] if line[i + 6:i + 8] == 'FF' else line[i:i + 8])
+        for x, i in enumerate(range(0, stride, 8))
+    ]
+
+
+def _prepare(img, size):
     w, h = img.size
-    if (w, h) != (size, size) and resize:
-        img = img.resize((size, size), resample=Image.NEAREST)
+    if w < size or h < size:
+        raise IndexError('image index out of range')
+    if (w, h) != (size, size):
+        img = img.crop((0, 0, size, size))
+    if img.mode != 'RGBA':
+        img = img.convert('RGBA')
+    return img
+
+
+def encode_rows(img, size, labels=ROW_LABELS, rle=False, palette=None):
+    """Encode the top-left size x size RGBA pixels of `img` into row code lists.
+
+    Pulls the whole RGBA buffer out with a single `tobytes()` call and formats
+    each row in bulk; output is identical to formatting every pixel with
+    `color_to_hex`. With `rle`, same-colour runs become span codes. If
+    `palette` is a dict, colours are replaced by their index in it and new
+    colours are added in order of first appearance.
+    """
+    img = _prepare(img, size)
+
+    # hex of every pixel (RRGGBBAA) in row-major order; opaque pixels drop AA
+    hexdata = img.tobytes().hex().upper()
+    stride = size * 8
+    cols = [f"{x}_" for x in range(size)]
 
     rows = {}
+    for y in range(size):
+        rows[labels[y]] = _encode_line(hexdata[y * stride:(y + 1) * stride], f"{size}{labels[y]}", cols, rle, palette)
+    return rows
+
+
+def iter_encoded_rows(img, size, rle=False, band=STREAM_BAND):
+    """Yield (label, codes) for each row of `img`, any size.
+
+    Pixels are pulled `band` rows at a time, so memory stays flat however
+    large the grid; rows past 32 get multi-letter labels (`row_label`).
+    """
+    img = _prepare(img, size)
+    stride = size * 8
+    cols = [f"{x}_" for x in range(size)]
+    for top in range(0, size, band):
+        bottom = min(top + band, size)
+        hexdata = img.crop((0, top, size, bottom)).tobytes().hex().upper()
+        for y in range(top, bottom):
+            label = row_label(y)
+            offset = (y - top) * stride
+            yield label, _encode_line(hexdata[offset:offset + stride], f"{size}{label}", cols, rle, None)
+
+
+def default_output_path(path, size):
+    base = os.path.splitext(os.path.basename(path))[0]
+    return f"{base}_pixels_codes_{size}x{size}.json"
+
+
+def frame_delta(size, prev_rows, rows):
+    """Delta rows turning one frame's per-pixel codes into the next frame's."""
+    delta = {}
+    for label, codes in rows.items():
+        changes = {x: code.split('_', 1)[1]
+                   for x, (old, code) in enumerate(zip(prev_rows[label], codes)) if old != code}
+        if changes:
+            delta[label] = changed_codes(size, label, changes)
+    return delta
+
+
+def animation_to_codes(img, path, size=32, output_path=None, resize=True, rle=False, palette=False):
+    """Stream every frame of an animated image into an animation JSON.
+
+    Each frame is encoded per pixel and compared with the previous one; only
+    the first frame is written in full. The palette (if any) is written
+    after the frames since it grows as new colours appear.
+    """
     if size > len(ROW_LABELS):
         raise ValueError(f"Requested size {size} is too large for available row labels ({len(ROW_LABELS)})")
+    if not output_path:
+        output_path = default_output_path(path, size)
+
+    colors = {} if palette else None
+    prev = None
+    with img, open(output_path, 'w', encoding='utf-8') as f:
+        f.write(f'{{\n  "format": "animation",\n  "size": {size},\n  "loop": {img.info.get("loop", 0)},\n'
+                f'  "frames": [')
+        for i, frame in enumerate(ImageSequence.Iterator(img)):
+            duration = frame.info.get('duration', img.info.get('duration', 100))
+            with phase('resize'):
+                rgba = frame.convert('RGBA')
+                if rgba.size != (size, size) and resize:
+                    rgba = rgba.resize((size, size), resample=Image.NEAREST)
+            with phase('encode'):
+                rows = encode_rows(rgba, size, palette=colors)
+                if prev is None:
+                    keyrows = rows
+                    if rle:
+                        keyrows = {label: run_length_codes(f"{size}{label}",
+                                                           [code.split('_', 1)[1] for code in codes])
+                                   for label, codes in rows.items()}
+                    entry = {'duration': duration, 'rows': keyrows}
+                else:
+                    entry = {'duration': duration, 'delta': {'rows': frame_delta(size, prev, rows)}}
+            with phase('write'):
+                f.write(',' if i else '')
+                f.write('\n    ' + json.dumps(entry, ensure_ascii=False))
+            prev = rows
+        f.write('\n  ]')
+        if palette:
+            f.write(',\n  "palette": ' + json.dumps(list(colors), ensure_ascii=False))
+        f.write('\n}\n')
+    return output_path
+
+
+def image_to_data(img, size=32, resize=True, rle=False, palette=False):
+    """Encode an opened RGBA image into the pixel-code dict (no file I/O)."""
+    w, h = img.size
+    if (w, h) != (size, size) and resize:
+        with phase('resize'):
+            img = img.resize((size, size), resample=Image.NEAREST)
+
+    if size > len(ROW_LABELS):
+        raise ValueError(f"Requested size {size} is too large for available row labels ({len(ROW_LABELS)})")
+
+    # separate color with an underscore for clarity: e.g. 32A0_FFFFFF
+    colors = {} if palette else None
+    with phase('encode'):
+        rows = encode_rows(img, size, rle=rle, palette=colors)
+
+    if palette:
+        return {"palette": list(colors), "rows": rows}
+    return {"rows": rows}
+
+
+def stream_image_to_codes(img, output_path, size, resize=True, rle=False, palette=False):
+    """Encode `img` row by row straight into `output_path` (.json or .ndjson).
+
+    Used above 32 rows and for .ndjson output; only one band of rows is
+    held at a time. A palette is not supported here because it would have
+    to be written before rows that have not been seen yet.
+    """
+    if palette:
+        raise ValueError('Palette output needs the whole image; it is not available above '
+                         f'{len(ROW_LABELS)} rows or for .ndjson output')
+    if img.size != (size, size) and resize:
+        with phase('resize'):
+            img = img.resize((size, size), resample=Image.NEAREST)
+    with phase('encode'):
+        write_rows(output_path, iter_encoded_rows(img, size, rle))
+    return output_path
+
+
+def _move_to_store(store, output_path):
+    """Ingest a streamed output file into `store` under its name and drop the file."""
+    if store is not None:
+        store.put_file(output_path)
+        os.remove(output_path)
+    return output_path
+
+
+def quantize_stage(img, path, size=32, resize=True, colors=None, method='median', fixed_palette=None,
+                   palette_cache=None):
+    """Resize `img` (read from `path`) and reduce its colours before encoding."""
+    if img.size != (size, size) and resize:
+        with phase('resize'):
+            img = img.resize((size, size), resample=Image.NEAREST)
+    cache = PaletteCache(palette_cache) if palette_cache else None
+    with phase('quantize'):
+        return quantize_image(img, colors, method, fixed_palette, cache, path, {'size': list(img.size)})
+
+
+def image_to_codes(path, size=32, output_path=None, resize=True, rle=False, palette=False, frames=True,
+                   store=None, colors=None, quantize='median', fixed_palette=None, palette_cache=None):
+    """Encode the image at `path` and write its pixel-code file.
+
+    With a `codes_store.CodesStore` as `store`, the result is kept in the
+    store under `output_path`'s name instead of as a file. `colors` or
+    `fixed_palette` turn on the quantize stage (`quantize_stage`), with
+    fitted palettes cached in the `palette_cache` directory if given.
+    """
+    with phase('open'):
+        img = Image.open(path)
+        animated = frames and getattr(img, 'n_frames', 1) > 1
+        if not animated and img.mode != 'RGBA':
+            img = img.convert('RGBA')
+    if colors is not None or fixed_palette:
+        if animated:
+            raise ValueError('Colour quantization is not available for animated input; use --first-frame')
+        img = quantize_stage(img, path, size, resize, colors, quantize, fixed_palette, palette_cache)
+    if animated:
+        return _move_to_store(store, animation_to_codes(img, path, size, output_path, resize, rle, palette))
 
-    for y in range(size):
-        row_label = ROW_LABELS[y]
-        codes = []
-        for x in range(size):
-            r, g, b, a = img.getpixel((x, y))
-            hexcol = color_to_hex(r, g, b, a if a != 255 else None)
-            # separate color with an underscore for clarity: e.g. 32A0_FFFFFF
-            code = f"{size}{row_label}{x}_{hexcol}"
-            codes.append(code)
-        rows[row_label] = codes
-
-    out = {"rows": rows}
     if not output_path:
-        base = os.path.splitext(os.path.basename(path))[0]
-        output_path = f"{base}_pixels_codes_{size}x{size}.json"
+        output_path = default_output_path(path, size)
+    if size > len(ROW_LABELS) or is_ndjson(output_path):
+        return _move_to_store(store, stream_image_to_codes(img, output_path, size, resize, rle, palette))
+
+    out = image_to_data(img, size, resize, rle, palette)
+    if store is not None:
+        with phase('write'):
+            store.set_ref(output_path, store.put_data(out))
+        return output_path
 
-    with open(output_path, 'w', encoding='utf-8') as f:
+    with phase('write'), open(output_path, 'w', encoding='utf-8') as f:
         json.dump(out, f, indent=2, ensure_ascii=False)
 
     return output_path
@@ -106,7 +346,33 @@ def main():
     parser.add_argument('--size', '-s', type=int, default=32, help='Target width/height (default 32).')
     parser.add_argument('--output', '-o', help='Output JSON path (optional).')
     parser.add_argument('--no-resize', dest='resize', action='store_false', help='Do not resize input image; require exact size.')
+    parser.add_argument('--rle', action='store_true', help='Collapse same-colour runs into span codes like 32A0-15_00E9FF.')
+    parser.add_argument('--palette', action='store_true', help='Write a shared "palette" array and use palette indexes as code colours.')
+    parser.add_argument('--colors', type=int, metavar='N', help='Reduce the image to at most N RGB colours (1-256) before encoding; alpha is kept.')
+    parser.add_argument('--quantize', choices=QUANTIZE_METHODS, default='median', help='Colour reduction method for --colors (default median).')
+    parser.add_argument('--fixed-palette', metavar='PALETTE', help='Snap colours to "basic" or a comma-separated RRGGBB list instead.')
+    parser.add_argument('--palette-cache', nargs='?', const=PALETTE_CACHE_DIR, metavar='DIR', help=f'Reuse fitted palettes per source image (default {PALETTE_CACHE_DIR}).')
+    parser.add_argument('--first-frame', dest='frames', action='store_false', help='Encode only the first frame of animated GIF/APNG input.')
+    parser.add_argument('--store', nargs='?', const=STORE_DIR, metavar='DIR', help=f'Keep the result in a deduplicating codes_store (default {STORE_DIR}) instead of a JSON file.')
+    parser.add_argument('--batch', nargs='+', metavar='PATH', help='Convert every image in these files, directories or globs (no dialogs or prompts).')
+    parser.add_argument('--workers', '-j', type=int, help='Batch worker processes (default: CPU count).')
+    parser.add_argument('--output-dir', help='Batch output directory (default: current directory).')
+    parser.add_argument('--manifest', help='Batch summary manifest path (default: <output-dir>/batch_manifest.json).')
+    add_profile_arguments(parser, 'image_to_codes')
     args = parser.parse_args()
+    if args.colors is not None and not 1 <= args.colors <= 256:
+        parser.error('--colors must be between 1 and 256')
+
+    if args.batch:
+        from batch_convert import run_batch
+        manifest = run_batch('image_to_codes', args.batch, output_dir=args.output_dir, workers=args.workers,
+                             manifest_path=args.manifest, size=args.size, resize=args.resize, rle=args.rle,
+                             palette=args.palette, frames=args.frames, colors=args.colors, quantize=args.quantize,
+                             fixed_palette=args.fixed_palette, palette_cache=args.palette_cache,
+                             store=args.store)
+        if manifest['failed']:
+            raise SystemExit(1)
+        return
 
     image_path = args.image
 
@@ -156,15 +422,28 @@ def main():
             pass
 
         if accepted is None:
-            resp = input(f"Detected image size {preview_img.size}. Recommend using {recommended}x{recommended}. Use recommended size? [Y/n]: ")
-            accepted = (resp.strip() == '' or resp.strip().lower().startswith('y'))
+            try:
+                resp = input(f"Detected image size {preview_img.size}. Recommend using {recommended}x{recommended}. Use recommended size? [Y/n]: ")
+                accepted = (resp.strip() == '' or resp.strip().lower().startswith('y'))
+            except EOFError:
+                # no terminal (CI, pixelcodes server): keep the requested size
+                accepted = False
 
         if accepted:
             chosen_size = recommended
 
+    store = CodesStore(args.store) if args.store else None
+
     try:
-        out = image_to_codes(image_path, size=chosen_size, output_path=args.output, resize=args.resize)
-        print(f"Wrote codes JSON to: {out}")
+        with maybe_profiled(args.profile, 'image_to_codes', args.cprofile):
+            out = image_to_codes(image_path, size=chosen_size, output_path=args.output, resize=args.resize,
+                                 rle=args.rle, palette=args.palette, frames=args.frames, store=store,
+                                 colors=args.colors, quantize=args.quantize, fixed_palette=args.fixed_palette,
+                                 palette_cache=args.palette_cache)
+        if store is not None:
+            print(f"Stored codes as {out} in {store.path}")
+        else:
+            print(f"Wrote codes JSON to: {out}")
     except Exception as e:
         print(f"Error: {e}")
         raise
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+phase_timing.py
+
+Opt-in phase timing for the CLIs (`--profile`). Library code marks its
+phases with
+
+    with phase('encode'):
+        ...
+
+which is a shared no-op context unless a run is being profiled, so the
+hooks can stay in the hot path. `profiled()` (or `maybe_profiled()` from a
+CLI's --profile/--cprofile options) turns recording on for one
+run, optionally wraps it in cProfile, and writes a JSON report with wall
+time, net allocated bytes and peak bytes (tracemalloc) per phase, plus the
+top cProfile entries and a `.prof` file for pstats/snakeviz.
+"""
+import json
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+
+_NULL = nullcontext()
+_recorder = None
+
+
+class _Phase:
+    __slots__ = ('recorder', 'name', 'start', 'mem_start')
+
+    def __init__(self, recorder, name):
+        self.recorder = recorder
+        self.name = name
+
+    def __enter__(self):
+        if self.recorder.allocations:
+            tracemalloc.reset_peak()
+            self.mem_start = tracemalloc.get_traced_memory()[0]
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        entry = {'phase': self.name, 'seconds': round(time.perf_counter() - self.start, 6)}
+        if self.recorder.allocations:
+            current, peak = tracemalloc.get_traced_memory()
+            entry['alloc_bytes'] = current - self.mem_start
+            entry['peak_bytes'] = peak - self.mem_start
+            self.recorder.peak = max(self.recorder.peak, peak)
+        self.recorder.phases.append(entry)
+        return False
+
+
+class _Recorder:
+    def __init__(self, allocations):
+        self.allocations = allocations
+        self.phases = []
+        self.peak = 0
+
+
+def phase(name):
+    """Context manager timing one phase; a no-op unless profiling is on."""
+    if _recorder is None:
+        return _NULL
+    return _Phase(_recorder, name)
+
+
+def _top_stats(profiler, limit):
+    import pstats
+    stats = pstats.Stats(profiler)
+    rows = []
+    for (filename, line, func), (cc, nc, tt, ct, _) in stats.stats.items():
+        rows.append({'function': f'{filename}:{line}({func})', 'ncalls': nc,
+                     'tottime': round(tt, 6), 'cumtime': round(ct, 6)})
+    rows.sort(key=lambda r: r['cumtime'], reverse=True)
+    return rows[:limit]
+
+
+@contextmanager
+def profiled(report_path, command=None, cprofile=False, allocations=True, top=30):
+    """Record phases for the enclosed run and write a JSON report.
+
+    With `cprofile`, the run is also profiled; the report gets the `top`
+    functions by cumulative time and the raw stats go to <report>.prof.
+    """
+    global _recorder
+    recorder = _Recorder(allocations)
+    profiler = None
+    if allocations:
+        tracemalloc.start()
+    if cprofile:
+        import cProfile
+        profiler = cProfile.Profile()
+    _recorder = recorder
+    start = time.perf_counter()
+    try:
+        if profiler is not None:
+            profiler.enable()
+        yield recorder
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        total = time.perf_counter() - start
+        _recorder = None
+        report = {'command': command, 'total_seconds': round(total, 6), 'phases': recorder.phases}
+        if allocations:
+            report['peak_bytes'] = max(recorder.peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+        if profiler is not None:
+            prof_path = f'{report_path}.prof'
+            profiler.dump_stats(prof_path)
+            report['cprofile'] = {'stats_file': prof_path, 'top': _top_stats(profiler, top)}
+        with open(report_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+
+def maybe_profiled(report_path, command=None, cprofile=False):
+    """`profiled(...)` when `report_path` is set, otherwise a no-op context."""
+    if not report_path:
+        return nullcontext()
+    return profiled(report_path, command, cprofile=cprofile)
+
+
+def add_profile_arguments(parser, command):
+    """Add the shared --profile/--cprofile options to a CLI parser."""
+    parser.add_argument('--profile', nargs='?', const=f'{command}_profile.json', metavar='REPORT',
+                        help=f'Write per-phase timing/allocation report (default {command}_profile.json)')
+    parser.add_argument('--cprofile', action='store_true', help='With --profile, also run under cProfile')
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+pipeline.py
+
+Image -> `codes.json` in one process, without the intermediate
+`as_pixels_codes_32x32.json` and the re-reads between
+`image_to_codes.py`, `generate_codes_json.py` and the remap scripts.
+
+Each stage is a plain function on in-memory data, so they can be chained
+in other orders or reused:
+
+  encode(image)        -> rows          (image_to_codes.image_to_data)
+  group(rows)          -> codes map     (generate_codes_json.build_codes_map)
+  remap(map, scheme)   -> codes map     (remap_codes_to_english / _love_words)
+  write(path, map)                      (codes_map.write_codes, atomic)
+
+The output is the same as running the scripts one after another.
+
+Usage:
+  py -3 pipeline.py as.png --remap english
+  py -3 pipeline.py sprite.gif --size 16 --remap love --output codes.json
+"""
+import argparse
+
+from PIL import Image
+
+from codes_index import INDEX_PATH
+from codes_map import write_codes
+from generate_codes_json import OUTPUT as CODES_JSON, build_codes_map
+from image_to_codes import image_to_data
+from phase_timing import add_profile_arguments, maybe_profiled, phase
+from remap_codes_to_english import remap_english
+from remap_codes_to_love_words import remap_love_words
+
+REMAPS = {
+    'english': remap_english,
+    'love': remap_love_words,
+}
+
+
+def encode(image, size=32, resize=True, rle=False):
+    """Encode an image (path or PIL image) and return its `rows` dict."""
+    with phase('open'):
+        img = Image.open(image) if isinstance(image, str) else image
+        img = img.convert('RGBA')
+    return image_to_data(img, size, resize, rle)['rows']
+
+
+def group(rows):
+    """Group rows into the secret-key map (ROW_* keys plus REVEAL_ALL)."""
+    with phase('group'):
+        return build_codes_map(rows)
+
+
+def remap(codes_map, scheme=None):
+    """Rename keys with one of REMAPS; `None` returns the map unchanged."""
+    if scheme is None:
+        return codes_map
+    if scheme not in REMAPS:
+        raise ValueError(f'Unknown remap {scheme!r} (choose from {", ".join(REMAPS)})')
+    with phase('remap'):
+        return REMAPS[scheme](codes_map)
+
+
+def write(path, codes_map, legacy=False):
+    with phase('write'):
+        write_codes(path, codes_map, legacy=legacy)
+    return path
+
+
+def run_pipeline(image, output=CODES_JSON, size=32, resize=True, rle=False, scheme=None, legacy=False,
+                 index=None):
+    """encode -> group -> remap -> write (-> index); returns the final codes map."""
+    codes_map = remap(group(encode(image, size, resize, rle)), scheme)
+    write(output, codes_map, legacy)
+    if index:
+        from codes_index import update_index
+        with phase('index'):
+            update_index(index, codes_map)
+    return codes_map
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build codes.json straight from an image, in memory')
+    parser.add_argument('image', help='Path to input image')
+    parser.add_argument('--size', '-s', type=int, default=32, help='Target width/height (default 32)')
+    parser.add_argument('--no-resize', dest='resize', action='store_false', help='Do not resize the input image')
+    parser.add_argument('--rle', action='store_true', help='Write span codes')
+    parser.add_argument('--remap', choices=sorted(REMAPS), help='Rename keys with a remap scheme')
+    parser.add_argument('--output', '-o', default=CODES_JSON, help=f'Output path (default {CODES_JSON})')
+    parser.add_argument('--legacy-reveal-all', action='store_true', help='Write REVEAL_ALL as a full flattened copy')
+    parser.add_argument('--index', nargs='?', const=INDEX_PATH, metavar='PATH', help=f'Also update the reverse-lookup index (default {INDEX_PATH})')
+    add_profile_arguments(parser, 'pipeline')
+    args = parser.parse_args()
+
+    with maybe_profiled(args.profile, 'pipeline', args.cprofile):
+        codes_map = run_pipeline(args.image, args.output, args.size, args.resize, args.rle, args.remap,
+                                 args.legacy_reveal_all, args.index)
+    print(f'Wrote {args.output} with {len(codes_map)} keys (including REVEAL_ALL)')
+
+
+if __name__ == '__main__':
+    main()
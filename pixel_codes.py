@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+pixel_codes.py
+
+Shared pixel-code parser used by every tool in this folder.
+
+A pixel code is <size><Row><Col>[-<End>][_]<Color>, for example
+`32H11_FF0000` or the span form `32A0-15_00E9FF`. Rows 0-31 are labelled
+A-Z, a-f; larger grids continue with multi-letter labels (`row_label`),
+e.g. `64AA0_FF0000` for row 32. Surrounding whitespace is
+ignored. The colour part is hex (RGB, RGBA, RRGGBB or RRGGBBAA, optional
+'#'), a basic colour name, or - in files with a top-level "palette" - an
+index into that palette. An empty or unknown colour resolves to magenta.
+
+`script.js` uses the same regular expression as `CODE_RE`.
+"""
+import re
+from functools import lru_cache
+
+ROW_LABELS = [
+    # 26 uppercase A-Z, then lowercase a-f to get up to 32 rows total
+    *[chr(ord('A') + i) for i in range(26)],
+    'a', 'b', 'c', 'd', 'e', 'f'
+]
+
+ROW_INDEX = {label: y for y, label in enumerate(ROW_LABELS)}
+
+# Rows past the first 32 use labels of two or more letters from this
+# alphabet, counted in order: row 32 is 'AA', 33 'AB', ..., then 'AAA'
+# after 'zz'. Single letters keep their original meaning.
+LABEL_LETTERS = ''.join(chr(ord('A') + i) for i in range(26)) + ''.join(chr(ord('a') + i) for i in range(26))
+_LETTER_VALUE = {ch: i for i, ch in enumerate(LABEL_LETTERS)}
+
+BASE_BASIC_COLORS = {
+    'black': (0, 0, 0, 255),
+    'white': (255, 255, 255, 255),
+    'red': (255, 0, 0, 255),
+    'green': (0, 255, 0, 255),
+    'blue': (0, 0, 255, 255),
+    'yellow': (255, 255, 0, 255),
+    'magenta': (255, 0, 255, 255),
+    'cyan': (0, 255, 255, 255),
+    'gray': (128, 128, 128, 255),
+    'transparent': (0, 0, 0, 0),
+}
+
+UNKNOWN_COLOR = (255, 0, 255, 255)
+
+
+def code_pattern(space=r'\s'):
+    """Regex source for one whole pixel code, with `space` as the whitespace
+    class (e.g. r'[^\\S\\n]' to match codes line by line in re.M mode)."""
+    return rf'^{space}*(\d+)([A-Za-z]+)(\d+)(?:-(\d+))?_?{space}*([A-Za-z0-9#]*){space}*$'
+
+
+# size, row label, column, optional span end, colour
+CODE_RE = re.compile(code_pattern())
+
+NON_HEX_RE = re.compile(r'[^0-9A-Fa-f]')
+
+# number of distinct colour strings kept by the colour cache
+COLOR_CACHE_SIZE = 4096
+# number of row labels kept by the row_index cache
+LABEL_CACHE_SIZE = 8192
+
+
+def row_label(y):
+    """Label for row `y`: ROW_LABELS for the first 32 rows, then 'AA', 'AB', ..."""
+    if y < len(ROW_LABELS):
+        return ROW_LABELS[y]
+    n = y - len(ROW_LABELS)
+    base = len(LABEL_LETTERS)
+    width = 2
+    while n >= base ** width:
+        n -= base ** width
+        width += 1
+    letters = []
+    for _ in range(width):
+        n, d = divmod(n, base)
+        letters.append(LABEL_LETTERS[d])
+    return ''.join(reversed(letters))
+
+
+@lru_cache(maxsize=LABEL_CACHE_SIZE)
+def row_index(label):
+    """Row index for a label (inverse of `row_label`), or None if invalid."""
+    if len(label) < 2:
+        return ROW_INDEX.get(label)
+    base = len(LABEL_LETTERS)
+    n = 0
+    for ch in label:
+        d = _LETTER_VALUE.get(ch)
+        if d is None:
+            return None
+        n = n * base + d
+    for width in range(2, len(label)):
+        n += base ** width
+    return len(ROW_LABELS) + n
+
+
+def row_labels(size):
+    """The first `size` row labels."""
+    if size <= len(ROW_LABELS):
+        return ROW_LABELS[:size]
+    return ROW_LABELS + [row_label(y) for y in range(len(ROW_LABELS), size)]
+
+
+def hex_to_rgba(s):
+    """Parse a hex colour string into an (r, g, b, a) tuple or None.
+
+    Accepts with or without '#', 3-digit (#RGB), 4-digit (#RGBA),
+    6-digit (#RRGGBB) and 8-digit (#RRGGBBAA) forms. Any non-hex characters
+    are dropped first.
+    """
+    if not s:
+        return None
+    hexchars = NON_HEX_RE.sub('', str(s).strip())
+    if len(hexchars) == 3:
+        # e.g. '0FA' -> '00FFAA'
+        r = int(hexchars[0] * 2, 16)
+        g = int(hexchars[1] * 2, 16)
+        b = int(hexchars[2] * 2, 16)
+        return (r, g, b, 255)
+    if len(hexchars) == 4:
+        r = int(hexchars[0] * 2, 16)
+        g = int(hexchars[1] * 2, 16)
+        b = int(hexchars[2] * 2, 16)
+        a = int(hexchars[3] * 2, 16)
+        return (r, g, b, a)
+    if len(hexchars) >= 6:
+        # prefer first 6 or first 8 if available
+        r = int(hexchars[0:2], 16)
+        g = int(hexchars[2:4], 16)
+        b = int(hexchars[4:6], 16)
+        if len(hexchars) >= 8:
+            a = int(hexchars[6:8], 16)
+        else:
+            a = 255
+        return (r, g, b, a)
+    return None
+
+
+@lru_cache(maxsize=COLOR_CACHE_SIZE)
+def color_to_rgba_bytes(color_name):
+    """Resolve a code's colour part to 4 RGBA bytes (LRU-cached).
+
+    Hex is tried first, then the named basic colours; anything unknown
+    becomes magenta to highlight it.
+    """
+    cn = str(color_name).strip()
+    rgba = hex_to_rgba(cn)
+    if rgba is None:
+        rgba = BASE_BASIC_COLORS.get(cn.lower())
+    if rgba is None:
+        rgba = UNKNOWN_COLOR
+    return bytes(rgba)
+
+
+class PixelCode:
+    """One parsed pixel code.
+
+    `y` is the row index (None for invalid labels, see `row_index`), `end` the
+    last column of a span (equal to `col` for single pixels), `color` the
+    colour string (palette indexes already resolved) and `rgba` its 4 RGBA
+    bytes.
+    """
+    __slots__ = ('size', 'row', 'y', 'col', 'end', 'color', 'rgba')
+
+    def __init__(self, size, row, col, end, color, rgba=None):
+        self.size = size
+        self.row = row
+        y = ROW_INDEX.get(row)
+        self.y = row_index(row) if y is None and len(row) > 1 else y
+        self.col = col
+        self.end = end
+        self.color = color
+        self.rgba = color_to_rgba_bytes(color) if rgba is None else rgba
+
+    @property
+    def is_span(self):
+        return self.end != self.col
+
+    def as_dict(self):
+        d = {'size': self.size, 'row': self.row, 'col': self.col, 'color': self.color}
+        if self.is_span:
+            d['end'] = self.end
+        return d
+
+    def __repr__(self):
+        return (f"PixelCode(size={self.size}, row={self.row!r}, col={self.col}, "
+                f"end={self.end}, color={self.color!r})")
+
+
+_UNKNOWN_RGBA = bytes(UNKNOWN_COLOR)
+
+
+def _resolve_palette(color, palette):
+    """Return (colour string, rgba or None) for a palette-index colour part."""
+    if color.isdigit() and int(color) < len(palette):
+        return palette[int(color)], None
+    # bad index: keep the raw part and mark it unknown
+    return color, _UNKNOWN_RGBA
+
+
+def parse_code(code, palette=None):
+    """Parse one pixel code into a PixelCode; raise ValueError if malformed."""
+    m = CODE_RE.match(code) if isinstance(code, str) else None
+    if m is None:
+        raise ValueError(f'Invalid code: {code!r}')
+    size, row, col, end, color = m.groups()
+    rgba = None
+    if palette is not None:
+        color, rgba = _resolve_palette(color, palette)
+    col = int(col)
+    return PixelCode(int(size), row, col, int(end) if end else col, color, rgba)
+
+
+def parse_many(codes, palette=None, strict=True):
+    """Parse a sequence of pixel codes into a list of PixelCode records.
+
+    With `strict`, a malformed code raises ValueError; otherwise its entry
+    is None. `palette` resolves palette-index colour parts.
+    """
+    match = CODE_RE.match
+    out = []
+    append = out.append
+    for code in codes:
+        m = match(code) if isinstance(code, str) else None
+        if m is None:
+            if strict:
+                raise ValueError(f'Invalid code: {code!r}')
+            append(None)
+            continue
+        size, row, col, end, color = m.groups()
+        rgba = None
+        if palette is not None:
+            color, rgba = _resolve_palette(color, palette)
+        col = int(col)
+        append(PixelCode(int(size), row, col, int(end) if end else col, color, rgba))
+    return out
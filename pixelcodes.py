@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+"""
+pixelcodes.py
+
+One entry point for every pixel-code tool. `pixelcodes <command> ...`
+imports only the module behind that command and runs its usual CLI, so
+e.g. `generate` or `remap-love` never load Pillow (and tkinter is only
+imported by the commands that open a dialog).
+
+Server mode keeps the modules warm for build systems that run thousands
+of short invocations:
+
+  py -3 pixelcodes.py serve &            # start on a free localhost port
+  py -3 pixelcodes.py --server decode sprite.json -o sprite.png
+
+`serve` listens on 127.0.0.1 only and writes its port and a random token
+to ~/.pixelcodes_server (readable by the user only); `--server` (or
+PIXELCODES_SERVER=1) sends the command there with the current directory
+and prints the captured output, and falls back to running locally when no
+server acknowledges the request within a few seconds. Where `os.fork`
+exists each request runs in a fork of the warm server, otherwise requests
+run one at a time. Served commands never prompt: dialogs are disabled and
+stdin is empty. `watch` always runs locally.
+
+Usage:
+  py -3 pixelcodes.py                       # list commands
+  py -3 pixelcodes.py encode as.png --size 32
+  py -3 pixelcodes.py serve [--port 0]
+  py -3 pixelcodes.py stop
+"""
+import importlib
+import io
+import os
+import sys
+
+# command -> (module, summary); modules are imported only when run
+COMMANDS = {
+    'encode': ('image_to_codes', 'Image -> pixel-code JSON'),
+    'decode': ('codes_to_image', 'Pixel-code JSON -> image'),
+    'extract': ('extract_codes', 'Flat / columnar code lists from pixel-code JSON'),
+    'generate': ('generate_codes_json', 'Build codes.json from the pixel-code rows'),
+    'remap-english': ('remap_codes_to_english', 'Rename codes.json keys to English words'),
+    'remap-love': ('remap_codes_to_love_words', 'Rename codes.json ROW_* keys to Spanish words'),
+    'pipeline': ('pipeline', 'Image -> codes.json in one process'),
+    'shards': ('build_code_shards', 'Split codes.json into per-key shards'),
+    'delta': ('codes_delta', 'Diff or apply pixel-code deltas'),
+    'stream': ('codes_stream', 'Convert between .json and .ndjson row by row'),
+    'binary': ('codes_binary', 'Pack or unpack the binary pixel-code format'),
+    'validate': ('validate_codes', 'Validate pixel-code files in bulk'),
+    'mosaic': ('compose_mosaic', 'Compose many tiles into one PNG'),
+    'atlas': ('render_atlas', 'Render pixel-code files into an atlas'),
+    'store': ('codes_store', 'Deduplicating pixel-code store'),
+    'index': ('codes_index', 'Reverse-lookup index over codes.json'),
+    'cache': ('decode_cache', 'Show or clear the decode cache'),
+    'watch': ('watch_codes', 'Re-encode changed images as they change'),
+}
+LOCAL_ONLY = {'watch'}
+
+SERVER_FILE = os.path.join(os.path.expanduser('~'), '.pixelcodes_server')
+SERVER_ENV = 'PIXELCODES_SERVER'
+# seconds the server waits for a connected client to send its request
+REQUEST_TIMEOUT = 2.0
+# seconds the client waits for the server to accept a request before
+# running the command itself
+ACK_TIMEOUT = 5.0
+
+
+def run_command(name, argv):
+    """Run command `name` with `argv` in this process; returns the exit code."""
+    module = importlib.import_module(COMMANDS[name][0])
+    saved = sys.argv
+    sys.argv = [f'pixelcodes {name}'] + list(argv)
+    try:
+        module.main()
+        return 0
+    except SystemExit as e:
+        if e.code is None or isinstance(e.code, int):
+            return e.code or 0
+        print(e.code, file=sys.stderr)
+        return 1
+    finally:
+        sys.argv = saved
+
+
+def print_commands():
+    print('usage: pixelcodes [--server] <command> [args...]\n')
+    print('commands:')
+    for name, (module, summary) in COMMANDS.items():
+        print(f'  {name:<14} {summary} ({module}.py)')
+    print(f"  {'serve':<14} Keep the commands warm on a local socket")
+    print(f"  {'stop':<14} Stop the running server")
+    print("\nRun 'pixelcodes <command> -h' for a command's options.")
+
+
+def _read_state():
+    """(pid, port, token) of the running server, or None."""
+    try:
+        with open(SERVER_FILE, 'r', encoding='utf-8') as f:
+            pid, port, token = f.read().split()
+        return int(pid), int(port), token
+    except (OSError, ValueError):
+        return None
+
+
+# Wire format (kept free of json/re so the client starts fast):
+#   request  "<n>\n" + n bytes of NUL-separated fields: token, cwd, command, args...
+#   ack      "+\n", sent once the request is accepted and about to run
+#   reply    "<code> <stdout bytes> <stderr bytes>\n" + stdout + stderr
+ACK = b'+\n'
+
+def _send_request(conn, fields):
+    payload = '\0'.join(fields).encode('utf-8', 'surrogateescape')
+    conn.sendall(b'%d\n' % len(payload) + payload)
+
+
+def _read_request(f):
+    size = f.readline(32)
+    if not size.strip().isdigit():
+        return None
+    return f.read(int(size)).decode('utf-8', 'surrogateescape').split('\0')
+
+
+def _send_reply(conn, code, out='', err=''):
+    out, err = out.encode('utf-8'), err.encode('utf-8')
+    conn.sendall(b'%d %d %d\n' % (code, len(out), len(err)) + out + err)
+
+
+def _request(command, argv=()):
+    """Send one command to the running server; returns (code, stdout, stderr) or None."""
+    import socket
+
+    state = _read_state()
+    if state is None:
+        return None
+    try:
+        conn = socket.create_connection(('127.0.0.1', state[1]), timeout=1.0)
+    except OSError:
+        return None
+    acked = False
+    with conn:
+        # a stalled server must not hang the client: without an ack in time
+        # the command runs locally instead
+        conn.settimeout(ACK_TIMEOUT)
+        try:
+            _send_request(conn, [state[2], os.getcwd(), command, *argv])
+            with conn.makefile('rb') as f:
+                line = f.readline()
+                if line == ACK:
+                    # the command is running; wait for it however long it takes
+                    acked = True
+                    conn.settimeout(None)
+                    line = f.readline()
+                header = line.split()
+                if len(header) != 3:
+                    return None
+                code, n_out, n_err = map(int, header)
+                out = f.read(n_out).decode('utf-8')
+                err = f.read(n_err).decode('utf-8')
+        except OSError as e:
+            if not acked:
+                return None
+            # the server already ran (part of) the command; do not run it twice
+            return 1, '', f'pixelcodes: lost the server connection: {e}\n'
+    return code, out, err
+
+
+def run_remote(name, argv):
+    """Run a command on the server; returns its exit code, or None if no server answered."""
+    reply = _request(name, argv)
+    if reply is None:
+        return None
+    code, out, err = reply
+    sys.stdout.write(out)
+    sys.stderr.write(err)
+    return code
+
+
+def _handle(workdir, name, argv):
+    """Run one command in `workdir` with captured output; returns (code, stdout, stderr)."""
+    from contextlib import redirect_stderr, redirect_stdout
+    import traceback
+
+    out, err = io.StringIO(), io.StringIO()
+    saved_stdin, saved_tk = sys.stdin, sys.modules.get('tkinter')
+    cwd = os.getcwd()
+    code = 1
+    try:
+        if name not in COMMANDS or name in LOCAL_ONLY:
+            err.write(f'pixelcodes server: cannot run {name!r}\n')
+        else:
+            os.chdir(workdir)
+            # never block the server on a prompt or a dialog
+            sys.stdin = io.StringIO('')
+            sys.modules['tkinter'] = None
+            with redirect_stdout(out), redirect_stderr(err):
+                try:
+                    code = run_command(name, argv)
+                except Exception:
+                    traceback.print_exc()
+    finally:
+        sys.stdin = saved_stdin
+        if saved_tk is None:
+            sys.modules.pop('tkinter', None)
+        else:
+            sys.modules['tkinter'] = saved_tk
+        os.chdir(cwd)
+    return code, out.getvalue(), err.getvalue()
+
+
+def _reap_children(*_):
+    try:
+        while os.waitpid(-1, os.WNOHANG)[0]:
+            pass
+    except ChildProcessError:
+        pass
+
+
+def serve(port=0):
+    """Serve commands on 127.0.0.1:`port` (0 = any free port) until stopped."""
+    import hmac
+    import secrets
+    import socket
+
+    for module, _ in COMMANDS.values():
+        importlib.import_module(module)
+
+    token = secrets.token_hex(16)
+    server = socket.create_server(('127.0.0.1', port))
+    port = server.getsockname()[1]
+    fd = os.open(SERVER_FILE, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        f.write(f'{os.getpid()} {port} {token}\n')
+    print(f'pixelcodes server on 127.0.0.1:{port} (pid {os.getpid()}); stop with: pixelcodes stop', flush=True)
+
+    forking = hasattr(os, 'fork')
+    if forking:
+        import signal
+        # reap finished children as they exit, not only on the next accept
+        signal.signal(signal.SIGCHLD, _reap_children)
+    try:
+        while True:
+            conn, _ = server.accept()
+            with conn:
+                # a client that connects and sends nothing must not block the others
+                conn.settimeout(REQUEST_TIMEOUT)
+                try:
+                    with conn.makefile('rb') as f:
+                        fields = _read_request(f)
+                    if fields is None or len(fields) < 3:
+                        continue
+                    if not hmac.compare_digest(fields[0], token):
+                        _send_reply(conn, 1, err='pixelcodes server: bad token\n')
+                        continue
+                    _, workdir, name, *argv = fields
+                    if name == 'stop':
+                        _send_reply(conn, 0, 'Server stopped.\n')
+                        break
+                    conn.sendall(ACK)
+                except OSError:
+                    continue
+                if forking:
+                    if os.fork() == 0:
+                        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+                        server.close()
+                        try:
+                            conn.settimeout(None)
+                            _send_reply(conn, *_handle(workdir, name, argv))
+                        finally:
+                            os._exit(0)
+                else:
+                    try:
+                        conn.settimeout(None)
+                        _send_reply(conn, *_handle(workdir, name, argv))
+                    except OSError:
+                        pass
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        state = _read_state()
+        if state is not None and state[0] == os.getpid():
+            os.remove(SERVER_FILE)
+
+
+def main():
+    argv = sys.argv[1:]
+    use_server = os.environ.get(SERVER_ENV, '') not in ('', '0')
+    if argv and argv[0] == '--server':
+        use_server = True
+        argv = argv[1:]
+    if not argv or argv[0] in ('-h', '--help', 'help'):
+        print_commands()
+        return
+
+    name, args = argv[0], argv[1:]
+    if name == 'serve':
+        import argparse
+        parser = argparse.ArgumentParser(prog='pixelcodes serve', description='Keep pixelcodes commands warm on a local socket')
+        parser.add_argument('--port', type=int, default=0, help='Port on 127.0.0.1 (default: any free port)')
+        serve(parser.parse_args(args).port)
+        return
+    if name == 'stop':
+        reply = _request('stop')
+        print(reply[1].strip() if reply else 'No pixelcodes server is running.')
+        return
+    if name not in COMMANDS:
+        print(f'pixelcodes: unknown command {name!r}\n', file=sys.stderr)
+        print_commands()
+        raise SystemExit(2)
+
+    code = None
+    if use_server and name not in LOCAL_ONLY:
+        code = run_remote(name, args)
+    if code is None:
+        code = run_command(name, args)
+    raise SystemExit(code)
+
+
+if __name__ == '__main__':
+    main()
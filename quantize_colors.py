@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+quantize_colors.py
+
+Optional colour-reduction stage for `image_to_codes.py`, run after the
+resize and before encoding. Photos and anti-aliased art otherwise produce
+hundreds of distinct hex colours, which defeats span codes, palettes and
+the decode-side colour cache.
+
+The RGB channels are reduced to at most N colours with Pillow's C
+quantizer (the whole pixel buffer at once, no per-pixel Python):
+
+  median   median cut (default)
+  kmeans   median cut refined with k-means iterations
+  octree   fast octree
+
+or snapped to a fixed palette (`basic` = the opaque `BASE_BASIC_COLORS`,
+or a comma-separated hex list). Alpha is kept as it is; fully transparent
+pixels become `00000000` so they do not each keep their own colour.
+
+Fitted palettes are cached in `.palette_cache/` keyed by the SHA-256 of the
+source file plus the options, so re-encoding an unchanged image in a batch
+only re-applies its palette.
+
+Usage:
+  py -3 image_to_codes.py photo.jpg --colors 16 [--quantize kmeans]
+  py -3 image_to_codes.py --batch art/ --colors 32 --palette-cache .palette_cache
+  py -3 image_to_codes.py sprite.png --fixed-palette basic
+"""
+import hashlib
+import json
+import os
+from array import array
+from itertools import compress
+
+from PIL import Image
+
+from pixel_codes import BASE_BASIC_COLORS
+
+QUANTIZE_METHODS = ('median', 'kmeans', 'octree')
+PALETTE_CACHE_DIR = '.palette_cache'
+# k-means refinement passes for method 'kmeans'
+KMEANS_ITERATIONS = 8
+# bump when fitting changes so cached palettes are refitted
+PALETTE_CACHE_VERSION = 2
+
+FIXED_PALETTES = {
+    'basic': [rgba[:3] for rgba in BASE_BASIC_COLORS.values() if rgba[3] == 255],
+}
+
+_PIL_METHODS = {
+    'median': Image.Quantize.MEDIANCUT,
+    'kmeans': Image.Quantize.MEDIANCUT,
+    'octree': Image.Quantize.FASTOCTREE,
+}
+
+
+def parse_fixed_palette(spec):
+    """`basic` or 'RRGGBB,RRGGBB,...' -> list of (r, g, b)."""
+    if spec in FIXED_PALETTES:
+        return list(FIXED_PALETTES[spec])
+    colors = []
+    for item in spec.split(','):
+        item = item.strip().lstrip('#')
+        if len(item) != 6:
+            raise ValueError(f'Fixed palette colours must be RRGGBB hex, got {item!r}')
+        colors.append(tuple(bytes.fromhex(item)))
+    if not colors or len(colors) > 256:
+        raise ValueError('A fixed palette needs 1 to 256 colours')
+    return colors
+
+
+def _split(img):
+    """RGB image (transparent pixels black) and the opacity mask of an RGBA image."""
+    alpha = img.getchannel('A')
+    opaque = alpha.point(lambda a: 255 if a else 0)
+    rgb = Image.new('RGB', img.size)
+    rgb.paste(img.convert('RGB'), (0, 0), opaque)
+    return rgb, alpha, opaque
+
+
+def _opaque_strip(img):
+    """RGB image, one pixel high, of only the non-transparent pixels of an RGBA image."""
+    pixels = array('I', compress(memoryview(img.tobytes()).cast('I'), img.getchannel('A').tobytes()))
+    if not pixels:
+        return None
+    return Image.frombytes('RGBA', (len(pixels), 1), pixels.tobytes()).convert('RGB')
+
+
+def fit_palette(img, colors=16, method='median'):
+    """Fit up to `colors` colours to an RGBA image; returns a list of (r, g, b).
+
+    Only non-transparent pixels take part in the fit, so a transparent
+    background does not use up a palette slot.
+    """
+    if method not in QUANTIZE_METHODS:
+        raise ValueError(f'Unknown quantize method {method!r} (choose from {", ".join(QUANTIZE_METHODS)})')
+    if not 1 <= colors <= 256:
+        raise ValueError('--colors must be between 1 and 256')
+    rgb = _opaque_strip(img)
+    if rgb is None:
+        # nothing visible to fit; any single colour will do
+        return [(0, 0, 0)]
+    q = rgb.quantize(colors, method=_PIL_METHODS[method], kmeans=KMEANS_ITERATIONS if method == 'kmeans' else 0,
+                     dither=Image.Dither.NONE)
+    flat = q.getpalette()
+    used = sorted(i for _, i in q.getcolors(256))
+    return [tuple(flat[i * 3:i * 3 + 3]) for i in used]
+
+
+def apply_palette(img, palette):
+    """Map every pixel of an RGBA image to its nearest colour in `palette`."""
+    rgb, alpha, opaque = _split(img)
+    flat = [c for color in palette for c in color]
+    # pad with the first colour so unused slots never win the nearest search
+    flat += flat[:3] * (256 - len(palette))
+    pal_img = Image.new('P', (1, 1))
+    pal_img.putpalette(flat)
+    mapped = rgb.quantize(palette=pal_img, dither=Image.Dither.NONE).convert('RGBA')
+    mapped.putalpha(alpha)
+    out = Image.new('RGBA', img.size, (0, 0, 0, 0))
+    out.paste(mapped, (0, 0), opaque)
+    return out
+
+
+class PaletteCache:
+    """Fitted palettes on disk, one small JSON file per key."""
+
+    def __init__(self, path=PALETTE_CACHE_DIR):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    @staticmethod
+    def key(source_path, **options):
+        h = hashlib.sha256()
+        with open(source_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                h.update(chunk)
+        h.update(f'\0v{PALETTE_CACHE_VERSION}'.encode('ascii'))
+        h.update(json.dumps(options, sort_keys=True).encode('utf-8'))
+        return h.hexdigest()
+
+    def get(self, key):
+        try:
+            with open(os.path.join(self.path, f'{key}.json'), 'r', encoding='utf-8') as f:
+                return [tuple(bytes.fromhex(c)) for c in json.load(f)]
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def put(self, key, palette):
+        path = os.path.join(self.path, f'{key}.json')
+        tmp = f'{path}.{os.getpid()}.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump([bytes(c).hex().upper() for c in palette], f)
+        os.replace(tmp, path)
+
+
+def quantize_image(img, colors=None, method='median', fixed_palette=None, cache=None, source_path=None,
+                   cache_options=None):
+    """Reduce an RGBA image's colours; returns the new RGBA image.
+
+    At most `colors` RGB colours remain; alpha is carried through, so a
+    partly transparent pixel can still add an RGBA variant of one of them.
+    `fixed_palette` (a spec for `parse_fixed_palette`) wins over fitting
+    `colors` colours. With a `PaletteCache` and the `source_path` the image
+    was read from, fitted palettes are reused across runs; `cache_options`
+    adds anything else that shaped `img` (e.g. the target size) to the key.
+    """
+    if fixed_palette:
+        return apply_palette(img, parse_fixed_palette(fixed_palette))
+    if colors is None:
+        return img
+    key = None
+    palette = None
+    if cache is not None and source_path:
+        key = cache.key(source_path, colors=colors, method=method, **(cache_options or {}))
+        palette = cache.get(key)
+    if palette is None:
+        palette = fit_palette(img, colors, method)
+        if key is not None:
+            cache.put(key, palette)
+    return apply_palette(img, palette)
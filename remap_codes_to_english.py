@@ -3,20 +3,19 @@
 remap_codes_to_english.py
 
 Remap the first 31 non-REVEAL_ALL keys in `codes.json` to a list of
-English love-related words (UPPERCASE, no spaces). Preserve `REVEAL_ALL`.
+English love-related words (UPPERCASE, no spaces). Preserve `REVEAL_ALL`,
+written as references to the remapped keys (see `codes_map.py`).
 
 Usage:
-  py -3 remap_codes_to_english.py
+  py -3 remap_codes_to_english.py [--legacy-reveal-all] [--index]
 """
+import argparse
 import json, os, sys
 
-CODES = 'codes.json'
-if not os.path.exists(CODES):
-    print('Error: codes.json not found')
-    sys.exit(1)
+from codes_index import INDEX_PATH
+from codes_map import REVEAL_ALL, carry_reveal_all, make_refs, write_codes
 
-with open(CODES, 'r', encoding='utf-8') as f:
-    data = json.load(f)
+CODES = 'codes.json'
 
 # English love-related words (31)
 english = [
@@ -26,33 +25,56 @@ english = [
     'LOVEBUG','SOULMATE','CHERUB','MYDARLING','TENDER','SWEETS','BAE'
 ]
 
-# Determine keys to remap (preserve order)
-keys = [k for k in data.keys() if k != 'REVEAL_ALL']
-new = {}
-used = set()
-count = 0
-for k in keys:
-    if count < len(english):
-        new_key = english[count]
-        new[new_key] = data[k]
-        used.add(k)
-        count += 1
-    else:
-        # for any remaining keys beyond 31, keep them as-is (unlikely)
-        new[k] = data[k]
-
-# Ensure REVEAL_ALL preserved
-if 'REVEAL_ALL' in data:
-    new['REVEAL_ALL'] = data['REVEAL_ALL']
-else:
-    # create REVEAL_ALL by flattening remaining arrays in original order
-    flat = []
+
+def remap_english(data):
+    """Return a new codes map with the first 31 keys renamed to `english`."""
+    # Determine keys to remap (preserve order)
+    keys = [k for k in data.keys() if k != 'REVEAL_ALL']
+    new = {}
+    used = set()
+    renames = {}
+    count = 0
     for k in keys:
-        arr = data.get(k) or []
-        flat.extend(arr)
-    new['REVEAL_ALL'] = flat
+        if count < len(english):
+            new_key = english[count]
+            new[new_key] = data[k]
+            used.add(k)
+            renames[k] = new_key
+            count += 1
+        else:
+            # for any remaining keys beyond 31, keep them as-is (unlikely)
+            new[k] = data[k]
+
+    # Ensure REVEAL_ALL preserved (references follow the renamed keys)
+    if REVEAL_ALL in data:
+        new[REVEAL_ALL] = carry_reveal_all(data, new, renames)
+    else:
+        # create REVEAL_ALL from the remaining arrays in original order
+        new[REVEAL_ALL] = make_refs(renames.get(k, k) for k in keys if data.get(k))
+    return new
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Remap codes.json keys to English love words')
+    parser.add_argument('--legacy-reveal-all', action='store_true', help='Write REVEAL_ALL as a full flattened copy')
+    parser.add_argument('--index', nargs='?', const=INDEX_PATH, metavar='PATH', help=f'Also update the reverse-lookup index (default {INDEX_PATH})')
+    args = parser.parse_args()
+
+    if not os.path.exists(CODES):
+        print('Error: codes.json not found')
+        sys.exit(1)
+
+    with open(CODES, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+
+    new = remap_english(data)
+    write_codes(CODES, new, legacy=args.legacy_reveal_all)
+    if args.index:
+        from codes_index import update_index
+        update_index(args.index, new)
+
+    print(f'Wrote {CODES} with {len(new)} keys (including REVEAL_ALL)')
 
-with open(CODES, 'w', encoding='utf-8') as f:
-    json.dump(new, f, indent=2, ensure_ascii=False)
 
-print(f'Wrote {CODES} with {len(new)} keys (including REVEAL_ALL)')
+if __name__ == '__main__':
+    main()
@@ -3,11 +3,19 @@
 remap_codes_to_love_words.py
 
 Read `codes.json`, remap the first 31 ROW_* keys to Spanish love-word keys,
-and overwrite `codes.json` with the new mapping. Keeps `REVEAL_ALL` key.
+and overwrite `codes.json` with the new mapping. Keeps `REVEAL_ALL` key,
+written as references to the remapped keys (see `codes_map.py`).
+
+Usage:
+  py -3 remap_codes_to_love_words.py [--legacy-reveal-all] [--index]
 """
+import argparse
 import json
 import os
 
+from codes_index import INDEX_PATH
+from codes_map import REVEAL_ALL, carry_reveal_all, refs_for, write_codes
+
 CODES = 'codes.json'
 
 LOVE_KEYS = [
@@ -19,66 +27,95 @@ LOVE_KEYS = [
 
 ROW_LABELS = [chr(ord('A')+i) for i in range(26)] + list('abcdef')
 
-if not os.path.exists(CODES):
-    print('Error: codes.json not found in this folder')
-    raise SystemExit(1)
-
-with open(CODES, 'r', encoding='utf-8') as f:
-    data = json.load(f)
-
-# Prefer rows in `rows` key if file is in the pixels-style structure
-# but if codes.json already contains ROW_* keys, use them directly.
-new_map = {}
-
-# If file has top-level ROW_* keys, use that mapping
-existing_keys = [k for k in data.keys() if k.upper().startswith('ROW_')]
-if existing_keys:
-    # sort by ROW_A, ROW_B, ... using ROW_<letter> pattern
-    def row_sort_key(k):
-        lab = k.split('_',1)[1] if '_' in k else k
-        return lab
-    existing_keys = sorted(existing_keys, key=row_sort_key)
-    # map first 31 existing ROW_* to LOVE_KEYS
-    for i, love in enumerate(LOVE_KEYS):
-        if i < len(existing_keys):
-            src = existing_keys[i]
-            new_map[love] = data.get(src, [])
-        else:
-            new_map[love] = []
-else:
-    # try to find rows inside a 'rows' object
-    rows = data.get('rows') or data.get('Rows') or data.get('ROWS')
-    if not rows:
-        print('No ROW_* keys and no "rows" object found — aborting')
+
+def remap_love_words(data):
+    """Return a new codes map keyed by LOVE_KEYS.
+
+    `data` is a codes map with ROW_* keys or a pixel-code dict with a
+    `rows` object; raises ValueError if it has neither.
+    """
+    # Prefer rows in `rows` key if file is in the pixels-style structure
+    # but if codes.json already contains ROW_* keys, use them directly.
+    new_map = {}
+    renames = {}
+
+    # If file has top-level ROW_* keys, use that mapping
+    existing_keys = [k for k in data.keys() if k.upper().startswith('ROW_')]
+    if existing_keys:
+        # sort by ROW_A, ROW_B, ... using ROW_<letter> pattern
+        def row_sort_key(k):
+            lab = k.split('_',1)[1] if '_' in k else k
+            return lab
+        existing_keys = sorted(existing_keys, key=row_sort_key)
+        # map first 31 existing ROW_* to LOVE_KEYS
+        for i, love in enumerate(LOVE_KEYS):
+            if i < len(existing_keys):
+                src = existing_keys[i]
+                new_map[love] = data.get(src, [])
+                renames[src] = love
+            else:
+                new_map[love] = []
+    else:
+        # try to find rows inside a 'rows' object
+        rows = data.get('rows') or data.get('Rows') or data.get('ROWS')
+        if not rows:
+            raise ValueError('No ROW_* keys and no "rows" object found')
+        for i, love in enumerate(LOVE_KEYS):
+            if i < len(ROW_LABELS):
+                row_label = ROW_LABELS[i]
+                key = row_label
+                # rows may use uppercase labels
+                candidate = rows.get(key.upper()) or rows.get(key)
+                new_map[love] = candidate or []
+            else:
+                new_map[love] = []
+
+    # copy REVEAL_ALL if present (references follow the renamed keys),
+    # otherwise create by flattening
+    if REVEAL_ALL in data:
+        new_map[REVEAL_ALL] = carry_reveal_all(data, new_map, renames)
+    else:
+        flat = []
+        for r in ROW_LABELS:
+            arr = None
+            # existing data may be under rows
+            if isinstance(data.get('rows'), dict):
+                arr = data['rows'].get(r) or data['rows'].get(r.upper())
+            # or in original mapping under ROW_<r>
+            if not arr:
+                arr = data.get(f'ROW_{r}') or data.get(f'ROW_{r.upper()}')
+            if arr:
+                flat.extend(arr)
+        new_map[REVEAL_ALL] = refs_for(new_map, flat) or []
+    return new_map
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Remap codes.json ROW_* keys to Spanish love words')
+    parser.add_argument('--legacy-reveal-all', action='store_true', help='Write REVEAL_ALL as a full flattened copy')
+    parser.add_argument('--index', nargs='?', const=INDEX_PATH, metavar='PATH', help=f'Also update the reverse-lookup index (default {INDEX_PATH})')
+    args = parser.parse_args()
+
+    if not os.path.exists(CODES):
+        print('Error: codes.json not found in this folder')
+        raise SystemExit(1)
+
+    with open(CODES, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+
+    try:
+        new_map = remap_love_words(data)
+    except ValueError as e:
+        print(f'{e} — aborting')
         raise SystemExit(1)
-    for i, love in enumerate(LOVE_KEYS):
-        if i < len(ROW_LABELS):
-            row_label = ROW_LABELS[i]
-            key = row_label
-            # rows may use uppercase labels
-            candidate = rows.get(key.upper()) or rows.get(key)
-            new_map[love] = candidate or []
-        else:
-            new_map[love] = []
-
-# copy REVEAL_ALL if present (keep as-is), otherwise create by flattening
-if 'REVEAL_ALL' in data:
-    new_map['REVEAL_ALL'] = data['REVEAL_ALL']
-else:
-    flat = []
-    for r in ROW_LABELS:
-        arr = None
-        # existing data may be under rows
-        if isinstance(data.get('rows'), dict):
-            arr = data['rows'].get(r) or data['rows'].get(r.upper())
-        # or in original mapping under ROW_<r>
-        if not arr:
-            arr = data.get(f'ROW_{r}') or data.get(f'ROW_{r.upper()}')
-        if arr:
-            flat.extend(arr)
-    new_map['REVEAL_ALL'] = flat
-
-with open(CODES, 'w', encoding='utf-8') as f:
-    json.dump(new_map, f, indent=2, ensure_ascii=False)
-
-print(f'Wrote {CODES} with {len(new_map)} keys (including REVEAL_ALL)')
+
+    write_codes(CODES, new_map, legacy=args.legacy_reveal_all)
+    if args.index:
+        from codes_index import update_index
+        update_index(args.index, new_map)
+
+    print(f'Wrote {CODES} with {len(new_map)} keys (including REVEAL_ALL)')
+
+
+if __name__ == '__main__':
+    main()
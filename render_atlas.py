@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+render_atlas.py
+
+Pre-render every entry of `codes.json` (including `REVEAL_ALL`) into one
+packed atlas PNG plus a JSON index of per-key offsets, so the page can show
+a reveal from a single cached image instead of building hundreds of DOM
+nodes.
+
+Each entry is rasterised with `codes_to_image.rows_to_image` and cropped
+to the rows it covers: a single-row key becomes a <size>x1 strip and
+`REVEAL_ALL` the full <size>x<size> image. Entries are rendered on a
+process pool and packed onto shelves.
+
+Index layout (`<output base>.atlas.json`, or --index PATH):
+  {"width": W, "height": H, "images": {"1": "atlas.png", "8": "atlas@8x.png"},
+   "entries": {"<key>": {"x": 0, "y": 0, "w": 32, "h": 32}, ...},
+   "errors": {"<key>": "..."}}
+Offsets are in 1x pixels; multiply by the scale for scaled variants. With
+--hash-keys entries are named by the SHA-256 of the key, like the shards
+from `build_code_shards.py`.
+
+Usage:
+  py -3 render_atlas.py [codes.json] --output atlas.png --scale 1 8 --workers 4
+  py -3 render_atlas.py codes.json -o codes.png --index codes_atlas.json
+"""
+import argparse
+import json
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image
+
+from codes_map import load_codes
+from codes_to_image import rows_to_image
+from pixel_codes import ROW_INDEX, parse_many
+
+
+def render_entry(codes):
+    """Rasterise one code list; returns (width, height, RGBA bytes).
+
+    Returns (0, 0, b'') for lists without any drawable code.
+    """
+    rows = {}
+    for code, rec in zip(codes, parse_many(codes)):
+        rows.setdefault(rec.row, []).append(code)
+    ys = [ROW_INDEX[label] for label in rows if label in ROW_INDEX]
+    if not ys:
+        return 0, 0, b''
+    img = rows_to_image(rows).convert('RGBA')
+    top, bottom = min(ys), min(max(ys) + 1, img.height)
+    if top >= bottom:
+        return 0, 0, b''
+    img = img.crop((0, top, img.width, bottom))
+    return img.width, img.height, img.tobytes()
+
+
+def _render_job(key, codes):
+    try:
+        return key, render_entry(codes), None
+    except ValueError as e:
+        return key, None, str(e)
+
+
+def pack_shelves(sizes, padding=1):
+    """Place {key: (w, h)} boxes on shelves; returns ({key: (x, y)}, width, height)."""
+    if not sizes:
+        return {}, 0, 0
+    area = sum((w + padding) * (h + padding) for w, h in sizes.values())
+    width = max(max(w for w, _ in sizes.values()), math.ceil(math.sqrt(area)))
+    order = sorted(sizes, key=lambda k: (-sizes[k][1], -sizes[k][0]))
+    placed = {}
+    x = y = shelf_h = 0
+    for k in order:
+        w, h = sizes[k]
+        if x and x + w > width:
+            y += shelf_h + padding
+            x = shelf_h = 0
+        placed[k] = (x, y)
+        x += w + padding
+        shelf_h = max(shelf_h, h)
+    return placed, width, y + shelf_h
+
+
+def default_index_path(output_path):
+    return f'{os.path.splitext(output_path)[0]}.atlas.json'
+
+
+def render_atlas(codes_map, output_path='atlas.png', scales=(1,), workers=None, padding=1, hash_keys=False,
+                 index_path=None):
+    """Render every key of `codes_map` into an atlas; returns the index dict.
+
+    The index goes to `index_path` (default `default_index_path`).
+    """
+    keys = list(codes_map)
+    results = {}
+    errors = {}
+    jobs = [(key, list(codes_map[key])) for key in keys]
+    if workers == 1 or len(jobs) <= 1:
+        done = [_render_job(key, codes) for key, codes in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            done = list(pool.map(_render_job, *zip(*jobs)))
+    for key, tile, error in done:
+        if error is not None:
+            errors[key] = error
+        elif tile[0]:
+            results[key] = tile
+
+    placed, width, height = pack_shelves({k: (w, h) for k, (w, h, _) in results.items()}, padding)
+    atlas = Image.new('RGBA', (max(width, 1), max(height, 1)), (0, 0, 0, 0))
+    for key, (x, y) in placed.items():
+        w, h, data = results[key]
+        atlas.paste(Image.frombytes('RGBA', (w, h), data), (x, y))
+
+    if hash_keys:
+        from build_code_shards import key_digest
+        name = key_digest
+    else:
+        name = str
+
+    base, ext = os.path.splitext(output_path)
+    images = {}
+    for scale in scales:
+        path = output_path if scale == 1 else f'{base}@{scale}x{ext or ".png"}'
+        img = atlas if scale == 1 else atlas.resize((atlas.width * scale, atlas.height * scale), Image.NEAREST)
+        img.save(path)
+        images[str(scale)] = os.path.basename(path)
+
+    index = {
+        'width': atlas.width,
+        'height': atlas.height,
+        'images': images,
+        'entries': {name(key): {'x': placed[key][0], 'y': placed[key][1],
+                                'w': results[key][0], 'h': results[key][1]}
+                    for key in keys if key in placed},
+    }
+    if errors:
+        index['errors'] = {name(key): msg for key, msg in errors.items()}
+    with open(index_path or default_index_path(output_path), 'w', encoding='utf-8') as f:
+        json.dump(index, f, indent=2, ensure_ascii=False)
+    return index
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Render every codes.json entry into one packed atlas PNG')
+    parser.add_argument('input', nargs='?', default='codes.json', help='Path to codes.json (default codes.json)')
+    parser.add_argument('--output', '-o', default='atlas.png', help='Atlas PNG path (default atlas.png)')
+    parser.add_argument('--index', help='Index JSON path (default: <output base>.atlas.json)')
+    parser.add_argument('--scale', type=int, nargs='+', default=[1], help='Integer scales to write (default 1)')
+    parser.add_argument('--padding', type=int, default=1, help='Transparent pixels between entries (default 1)')
+    parser.add_argument('--workers', '-j', type=int, help='Render worker processes (default: CPU count)')
+    parser.add_argument('--hash-keys', action='store_true', help='Name index entries by SHA-256 of the key')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.input):
+        print(f'Error: {args.input} not found')
+        raise SystemExit(1)
+
+    index_path = args.index or default_index_path(args.output)
+    if os.path.abspath(index_path) in (os.path.abspath(args.input), os.path.abspath(args.output)):
+        print(f'Error: index path {index_path} is the input or the atlas itself; choose another --index')
+        raise SystemExit(1)
+
+    index = render_atlas(load_codes(args.input), args.output, args.scale, args.workers, args.padding, args.hash_keys,
+                         index_path)
+    print(f"Wrote {args.output} ({index['width']}x{index['height']}) with {len(index['entries'])} entries, "
+          f"index {index_path}")
+    for key, msg in index.get('errors', {}).items():
+        print(f'  skipped {key}: {msg}')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,17 @@
-/* load codes.json (mapping of special codes -> character lists) */
+/* load codes: prefer per-key shards (codes/manifest.json, see build_code_shards.py),
+   otherwise codes.json (mapping of special codes -> character lists) */
 let codesMap = {};
+let shardedCodes = false;
 (async function loadCodes(){
+	try{
+		const man = await fetch('./codes/manifest.json');
+		if(man.ok){
+			shardedCodes = true;
+			return;
+		}
+	}catch(e){
+		// no shards: fall through to codes.json
+	}
 	try{
 		const resp = await fetch('./codes.json');
 		if(resp.ok){
@@ -12,6 +23,22 @@ let codesMap = {};
 	}
 })();
 
+/* expand a codes.json entry; REVEAL_ALL may be {"$refs": [key | [codes], ...]} (see codes_map.py) */
+function resolveCodes(key, seen){
+	const value = codesMap[key];
+	if(!value || Array.isArray(value) || !Array.isArray(value['$refs'])) return value;
+	seen = seen || new Set();
+	if(seen.has(key)) return [];
+	seen.add(key);
+	const out = [];
+	value['$refs'].forEach(item => {
+		const codes = (typeof item === 'string') ? resolveCodes(item, seen) : item;
+		if(Array.isArray(codes)) out.push(...codes);
+	});
+	seen.delete(key);
+	return out;
+}
+
 /* optional pixels metadata file */
 let pixelsMap = {};
 (async function loadPixels(){
@@ -39,6 +66,10 @@ const BASIC_COLOR_MAP = {
 	orange: '#FFA500'
 };
 
+// Pixel-code pattern shared with pixel_codes.py CODE_RE:
+// size, row label (multi-letter past row 32), column, optional span end, colour
+const CODE_RE = /^\s*(\d+)([A-Za-z]+)(\d+)(?:-(\d+))?_?\s*([A-Za-z0-9#]*)\s*$/;
+
 // Row labels used by the pixel-code format (A-Z, then a-f)
 const ROW_LABELS = (()=>{
 	const up = Array.from({length:26},(_,i)=>String.fromCharCode(65+i));
@@ -84,6 +115,16 @@ const ROW_LABELS = (()=>{
 		return Array.from(new Uint8Array(buf)).map(b=>b.toString(16).padStart(2,'0')).join('');
 	}
 
+	/* fetch the code list for a key: one shard named by SHA-256 of the key, or codes.json */
+	async function lookupCodes(key){
+		if(shardedCodes){
+			const resp = await fetch(`./codes/${await sha256hex(key)}.json`);
+			return resp.ok ? await resp.json() : null;
+		}
+		if(codesMap && Object.prototype.hasOwnProperty.call(codesMap, key)) return resolveCodes(key);
+		return null;
+	}
+
 	/* show a full-screen centered overlay with characters converted to code/text */
 	function showCharsOverlay(chars){
 		// elements to hide while overlay is shown
@@ -111,7 +152,7 @@ const ROW_LABELS = (()=>{
 			glyph.textContent = codeStr;
 
 			// parse pieces: size (number), row (letter), column (number), color (text or hex)
-			const m = /^\s*(\d+)([A-Za-z])(\d+)_?([A-Za-z0-9#]+)\s*$/.exec(codeStr);
+			const m = CODE_RE.exec(codeStr);
 			const meta = document.createElement('div');
 			meta.className = 'code-meta';
 			if(m){
@@ -123,7 +164,7 @@ const ROW_LABELS = (()=>{
 				meta.appendChild(rc);
 
 				// color square instead of text
-				const colorPart = m[4];
+				const colorPart = m[5];
 				function colorPartToHex(part){
 					if(!part) return '#FF00FF';
 					let p = String(part).trim();
@@ -177,7 +218,7 @@ const ROW_LABELS = (()=>{
 		// returned `chars` represent a full row or the full image.
 		if(chars.length > 0){
 			const first = String(chars[0] || '').trim();
-			const mm = /^\s*(\d+)([A-Za-z])(\d+)_?([A-Za-z0-9#]+)\s*$/.exec(first);
+			const mm = CODE_RE.exec(first);
 			if(mm){
 				const size = parseInt(mm[1], 10);
 				// helper: normalize color part into a hex string like #RRGGBB
@@ -215,9 +256,9 @@ const ROW_LABELS = (()=>{
 						for(let c=0;c<size;c++){
 							const idx = (chars.length === size) ? c : (r*size + c);
 							const code = chars[idx] || '';
-							const mm2 = /^\s*(\d+)([A-Za-z])(\d+)_?([A-Za-z0-9#]+)\s*$/.exec(code);
+							const mm2 = CODE_RE.exec(code);
 							let hex = '#FF00FF';
-							if(mm2) hex = colorPartToHex(mm2[4]);
+							if(mm2) hex = colorPartToHex(mm2[5]);
 							const td = document.createElement('td');
 							td.textContent = hex;
 							td.style.padding = '6px 8px';
@@ -237,7 +278,7 @@ const ROW_LABELS = (()=>{
 					// fallback: previous behavior (random row/col color-list)
 					const row = mm[2];
 					const col = parseInt(mm[3],10);
-					const colorPart = mm[4];
+					const colorPart = mm[5];
 					const chooseRow = Math.random() < 0.5;
 					let codesList = [];
 					if(pixelsMap && pixelsMap.rows && pixelsMap.rows[row.toUpperCase()]){
@@ -273,9 +314,9 @@ const ROW_LABELS = (()=>{
 					listWrap.appendChild(title);
 
 					codesList.forEach(code => {
-						const mm2 = /^\s*(\d+)([A-Za-z])(\d+)_?([A-Za-z0-9#]+)\s*$/.exec(code);
+						const mm2 = CODE_RE.exec(code);
 						let hex = '#FF00FF';
-						if(mm2) hex = colorPartToHex(mm2[4]);
+						if(mm2) hex = colorPartToHex(mm2[5]);
 						const chip = document.createElement('div');
 						chip.textContent = hex;
 						chip.style.padding = '6px 10px';
@@ -394,8 +435,8 @@ const ROW_LABELS = (()=>{
 		try{
 			// check special codes (case-insensitive)
 			const key = code.trim().toUpperCase();
-			if(codesMap && Object.prototype.hasOwnProperty.call(codesMap, key)){
-				const chars = codesMap[key];
+			const chars = await lookupCodes(key);
+			if(chars){
 				// show centered overlay with character glyphs and codes
 				showCharsOverlay(chars);
 			} else {
@@ -0,0 +1,67 @@
+"""Output layout of --batch mode and watch mode."""
+import os
+
+from PIL import Image
+
+from batch_convert import iter_batch, plan_outputs
+from watch_codes import Watcher
+
+
+def make_images(root, *names):
+    paths = []
+    for i, name in enumerate(names):
+        path = root / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        Image.new('RGBA', (4, 4), (i * 40, 0, 0, 255)).save(path)
+        paths.append(str(path))
+    return paths
+
+
+def test_plan_outputs_keeps_subdirectories(tmp_path):
+    a, b = make_images(tmp_path, 'img/a/x.png', 'img/b/x.png')
+    out = str(tmp_path / 'out')
+    outputs = plan_outputs('image_to_codes', [a, b], out, size=32)
+    assert outputs[a] == os.path.join(out, 'a', 'x_pixels_codes_32x32.json')
+    assert outputs[b] == os.path.join(out, 'b', 'x_pixels_codes_32x32.json')
+
+
+def test_plan_outputs_flags_clashes(tmp_path):
+    png, gif = make_images(tmp_path, 'x.png', 'x.gif')
+    outputs = plan_outputs('image_to_codes', [png, gif], str(tmp_path / 'out'), size=32)
+    assert outputs[png] is not None
+    assert outputs[gif] is None
+
+
+def test_iter_batch_writes_planned_outputs(tmp_path):
+    paths = make_images(tmp_path, 'img/a/x.png', 'img/b/x.png', 'img/b/x.gif')
+    out = tmp_path / 'out'
+    results = {r['input']: r for r in iter_batch('image_to_codes', paths, str(out), workers=1, size=4)}
+    assert results[paths[0]]['error'] is None
+    assert results[paths[1]]['error'] is None
+    assert 'clashes' in results[paths[2]]['error']
+    assert sorted(os.listdir(out)) == ['a', 'b']
+    assert os.listdir(out / 'b') == ['x_pixels_codes_4x4.json']
+
+
+def test_watch_uses_batch_layout(tmp_path):
+    paths = make_images(tmp_path, 'img/a/x.png', 'img/b/x.png', 'img/b/x.gif')
+    out = tmp_path / 'out'
+    watcher = Watcher([str(tmp_path / 'img' / '**' / '*.*')], output_dir=str(out), debounce=0,
+                      codes_source=str(tmp_path / 'none.json'), codes_path=str(tmp_path / 'codes.json'), size=4)
+    results = watcher.step()
+    # the glob lists x.gif before x.png, so x.png is the clashing one
+    assert sorted(r['input'] for r in results) == [paths[0], paths[2]]
+    assert all(r['error'] is None for r in results)
+    assert os.path.exists(out / 'a' / 'x_pixels_codes_4x4.json')
+    assert os.path.exists(out / 'b' / 'x_pixels_codes_4x4.json')
+    # nothing changed: nothing to re-encode
+    assert watcher.step() == []
+
+
+def test_watch_retries_failed_encodes(tmp_path):
+    make_images(tmp_path, 'x.png')
+    watcher = Watcher([str(tmp_path / 'x.png')], output_dir=str(tmp_path / 'out'), debounce=0,
+                      codes_source=str(tmp_path / 'none.json'), codes_path=str(tmp_path / 'codes.json'), size=-1)
+    assert watcher.step()[0]['error'] is not None
+    watcher.options['size'] = 4
+    assert watcher.step()[0]['error'] is None
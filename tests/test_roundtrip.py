@@ -0,0 +1,87 @@
+"""Encode -> decode round trips for every pixel-code format."""
+import json
+
+import pytest
+from PIL import Image
+
+from codes_binary import PixelCodeFile, binary_to_json, json_to_binary
+from codes_store import CodesStore
+from codes_to_image import codes_json_to_image
+from image_to_codes import image_to_codes
+
+
+def sprite(size):
+    """RGBA test image with runs, transparent and semi-transparent pixels."""
+    img = Image.new('RGBA', (size, size), (0, 0, 0, 0))
+    for y in range(size):
+        for x in range(size):
+            if x < size // 2:
+                img.putpixel((x, y), (255, 0, 0, 255))
+            elif (x + y) % 3 == 0:
+                img.putpixel((x, y), (x * 7 % 256, y * 11 % 256, 200, 128))
+    return img
+
+
+@pytest.fixture
+def sprite_png(tmp_path):
+    path = tmp_path / 'sprite.png'
+    sprite(8).save(path)
+    return path
+
+
+def decoded(tmp_path, codes_path):
+    out = tmp_path / 'decoded.png'
+    codes_json_to_image(str(codes_path), str(out))
+    with Image.open(out) as img:
+        return img.convert('RGBA').tobytes()
+
+
+@pytest.mark.parametrize('rle, palette', [(False, False), (True, False), (False, True)],
+                         ids=['plain', 'rle', 'palette'])
+def test_json_round_trip(tmp_path, sprite_png, rle, palette):
+    codes = tmp_path / 'sprite.json'
+    image_to_codes(str(sprite_png), size=8, output_path=str(codes), rle=rle, palette=palette)
+    assert decoded(tmp_path, codes) == sprite(8).tobytes()
+
+
+def test_large_grid_round_trip(tmp_path):
+    png = tmp_path / 'big.png'
+    sprite(40).save(png)
+    for name in ('big.json', 'big.ndjson'):
+        codes = tmp_path / name
+        image_to_codes(str(png), size=40, output_path=str(codes))
+        assert decoded(tmp_path, codes) == sprite(40).tobytes()
+
+
+def test_pxc_round_trip(tmp_path, sprite_png):
+    codes = tmp_path / 'sprite.json'
+    image_to_codes(str(sprite_png), size=8, output_path=str(codes))
+    pxc = json_to_binary(str(codes), str(tmp_path / 'sprite.pxc'))
+    back = tmp_path / 'back.json'
+    binary_to_json(pxc, str(back))
+    assert json.loads(back.read_text())['rows'] == json.loads(codes.read_text())['rows']
+    with PixelCodeFile(pxc) as f:
+        assert f.code('A', 0) == '8A0_FF0000'
+        row = f.row_cells(0)
+    # a view still held after close keeps working
+    assert len(row) == 8
+
+
+def test_store_round_trip(tmp_path, sprite_png):
+    codes = tmp_path / 'sprite.json'
+    image_to_codes(str(sprite_png), size=8, output_path=str(codes))
+    store = CodesStore(str(tmp_path / 'store'))
+    h = store.put_file(str(codes), 'sprite.json')
+    # identical rows are stored once
+    assert store.put_file(str(codes), 'again.json') == h
+    out = tmp_path / 'out.json'
+    store.write_file('sprite.json', str(out))
+    assert out.read_bytes() == codes.read_bytes()
+
+
+def test_encode_into_store(tmp_path, sprite_png):
+    store = CodesStore(str(tmp_path / 'store'))
+    image_to_codes(str(sprite_png), size=8, output_path='sprite.json', store=store)
+    out = tmp_path / 'out.json'
+    store.write_file('sprite.json', str(out))
+    assert decoded(tmp_path, out) == sprite(8).tobytes()
@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+"""
+validate_codes.py
+
+Check pixel-code files (or whole directories / globs of them) before they
+are rendered, instead of finding out from a bad PNG. Each file is read row
+by row (`codes_stream.iter_rows`, so .ndjson and huge files work) in one
+pass, and files are checked in parallel on a process pool. Each row is
+matched with one regex pass over its joined codes and its coverage kept in
+a bytearray; only rows with issues are re-checked code by code.
+
+Issue types:
+  malformed      code does not match the pixel-code syntax
+  size_mismatch  code size differs from the file's size (its first code)
+  unknown_row    row label is not a valid label
+  row_mismatch   code's row label differs from the row it is listed under
+  out_of_range   row or column (or span end) outside the size x size grid
+  duplicate      column written by more than one code in a row
+  missing        row or columns without any code
+  unknown_color  colour is not hex (3/4/6/8 digits), a basic colour name
+                 or, in palette files, a valid palette index
+
+The report (--report) lists per file the issue counts and the first
+--max-samples occurrences, plus a summary; the exit status is 1 if any
+file has issues.
+
+Usage:
+  py -3 validate_codes.py as_pixels_codes_32x32.json
+  py -3 validate_codes.py codes/ "more/*.json" --workers 4 --report validation.json
+"""
+import argparse
+import json
+import os
+import re
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from batch_convert import JSON_EXTS, expand_inputs
+from codes_stream import iter_rows
+from pixel_codes import BASE_BASIC_COLORS, CODE_RE, code_pattern, row_index, row_label
+
+ISSUE_TYPES = ('malformed', 'size_mismatch', 'unknown_row', 'row_mismatch', 'out_of_range',
+               'duplicate', 'missing', 'unknown_color')
+
+VALIDATE_EXTS = JSON_EXTS + ('.jsonl',)
+
+# CODE_RE for a row's codes joined with newlines (whitespace other than newlines)
+ROW_CODES_RE = re.compile(code_pattern(r'[^\S\n]'), re.M)
+
+HEX_COLOR_RE = re.compile(r'#?(?:[0-9A-Fa-f]{3}|[0-9A-Fa-f]{4}|[0-9A-Fa-f]{6}|[0-9A-Fa-f]{8})$')
+
+
+def _runs(flags, value=0):
+    """[start, end] pairs of consecutive positions where flags[i] == value (flags are 0/1)."""
+    flags = bytes(flags)
+    other = 1 - value
+    runs = []
+    start = flags.find(value)
+    while start != -1:
+        stop = flags.find(other, start)
+        if stop == -1:
+            stop = len(flags)
+        runs.append([start, stop - 1])
+        start = flags.find(value, stop)
+    return runs
+
+
+class _Issues:
+    def __init__(self, max_samples):
+        self.counts = Counter()
+        self.samples = []
+        self.max_samples = max_samples
+
+    def add(self, kind, row=None, code=None, **detail):
+        self.counts[kind] += 1
+        if len(self.samples) < self.max_samples:
+            sample = {'type': kind}
+            if row is not None:
+                sample['row'] = row
+            if code is not None:
+                sample['code'] = code
+            sample.update(detail)
+            self.samples.append(sample)
+
+
+def _known_color(color, palette):
+    if palette is not None:
+        return color.isdigit() and int(color) < len(palette)
+    return bool(HEX_COLOR_RE.match(color)) or color.lower() in BASE_BASIC_COLORS
+
+
+def _check_row(label, y, codes, size, palette, issues):
+    """Per-code check of one row, reporting every issue; returns (size, coverage)."""
+    coverage = None
+    for code in codes:
+        m = CODE_RE.match(code) if isinstance(code, str) else None
+        if m is None:
+            issues.add('malformed', label, code)
+            continue
+        csize, crow, col, end, color = m.groups()
+        csize = int(csize)
+        if size is None:
+            size = csize
+        elif csize != size:
+            issues.add('size_mismatch', label, code, expected=size)
+        if crow != label:
+            issues.add('row_mismatch', label, code)
+        if not _known_color(color, palette):
+            issues.add('unknown_color', label, code)
+        col = int(col)
+        end = int(end) if end else col
+        if y is not None and y >= size:
+            issues.add('out_of_range', label, code)
+            continue
+        if end < col or end >= size:
+            issues.add('out_of_range', label, code)
+            end = min(end, size - 1)
+        if y is None or crow != label or col > end:
+            continue
+        if coverage is None:
+            coverage = bytearray(size)
+        if coverage.find(1, col, end + 1) != -1:
+            for x in range(col, end + 1):
+                if coverage[x]:
+                    issues.add('duplicate', label, code, col=x)
+        coverage[col:end + 1] = b'\1' * (end + 1 - col)
+    return size, coverage
+
+
+def _check_row_fast(label, y, codes, size, palette, colors_ok):
+    """Check one row with a single regex pass over its joined codes.
+
+    Returns (size, coverage) when the row is clean apart from missing
+    columns, or None when it has any other issue (the caller then re-checks
+    it with `_check_row` to report exactly what is wrong).
+    """
+    try:
+        joined = '\n'.join(codes)
+    except TypeError:
+        return None
+    if joined.count('\n') != len(codes) - 1:
+        return None
+    found = ROW_CODES_RE.findall(joined)
+    if len(found) != len(codes):
+        return None
+    sizes, labels, cols, ends, colors = zip(*found)
+    if len(set(sizes)) != 1 or set(labels) != {label}:
+        return None
+    row_size = int(sizes[0])
+    if size is None:
+        size = row_size
+    if row_size != size or y >= size:
+        return None
+    for color in set(colors):
+        known = colors_ok.get(color)
+        if known is None:
+            known = colors_ok[color] = _known_color(color, palette)
+        if not known:
+            return None
+    starts = list(map(int, cols))
+    coverage = bytearray(size)
+    if not any(ends):
+        # single-pixel codes: duplicates show up as repeated columns
+        columns = set(starts)
+        if len(columns) != len(starts) or max(columns) >= size:
+            return None
+        if len(columns) == size:
+            coverage[:] = b'\1' * size
+        else:
+            for x in columns:
+                coverage[x] = 1
+        return size, coverage
+    stops = [int(e) if e else s for s, e in zip(starts, ends)]
+    if max(stops) >= size or any(map(int.__gt__, starts, stops)):
+        return None
+    covered = 0
+    for s, e in zip(starts, stops):
+        coverage[s:e + 1] = b'\1' * (e + 1 - s)
+        covered += e + 1 - s
+    if coverage.count(1) != covered:
+        # overlapping codes
+        return None
+    return size, coverage
+
+
+def validate_rows(rows, meta, issues, complete=True):
+    """Check (label, codes) pairs; returns (size, code count).
+
+    `meta` supplies the palette (filled in while `rows` is consumed). With
+    `complete`, every row and column of the grid must be covered.
+    """
+    size = None
+    count = 0
+    seen_rows = set()
+    colors_ok = {}
+    palette_seen = None
+    for label, codes in rows:
+        palette = meta.get('palette')
+        if palette is not palette_seen:
+            # index colours depend on the palette
+            colors_ok = {}
+            palette_seen = palette
+        y = row_index(label) if isinstance(label, str) else None
+        if y is None:
+            issues.add('unknown_row', label)
+        if not isinstance(codes, list):
+            issues.add('malformed', label, codes)
+            continue
+        count += len(codes)
+        if not codes:
+            coverage = None
+        else:
+            checked = _check_row_fast(label, y, codes, size, palette, colors_ok) if y is not None else None
+            if checked is None:
+                checked = _check_row(label, y, codes, size, palette, issues)
+            size, coverage = checked
+        if y is not None and size is not None and y < size:
+            seen_rows.add(y)
+            if complete:
+                missing = _runs(coverage) if coverage is not None else [[0, size - 1]]
+                for start, stop in missing:
+                    issues.add('missing', label, cols=[start, stop])
+
+    if complete and size is not None:
+        flags = bytearray(size)
+        for y in seen_rows:
+            flags[y] = 1
+        for start, stop in _runs(flags):
+            issues.add('missing', rows=[row_label(start), row_label(stop)])
+    return size, count
+
+
+def validate_file(path, max_samples=20):
+    """Validate one pixel-code file; returns its report dict."""
+    start = time.perf_counter()
+    issues = _Issues(max_samples)
+    result = {'path': path, 'size': None, 'codes': 0}
+    try:
+        meta = {}
+        size, count = validate_rows(iter_rows(path, meta), meta, issues)
+        if meta.get('format') == 'animation':
+            # keyframe must be complete; deltas only need valid codes
+            frames = meta.get('frames') or []
+            for i, frame in enumerate(frames):
+                rows = frame.get('rows')
+                if rows is None:
+                    rows = frame.get('delta', {}).get('rows', {})
+                s, n = validate_rows(rows.items(), meta, issues, complete=i == 0 and 'rows' in frame)
+                size = size or s
+                count += n
+        elif size is None and not count:
+            issues.add('missing', message='No pixel codes found')
+        palette = meta.get('palette')
+        if palette is not None:
+            for i, color in enumerate(palette):
+                if not _known_color(str(color), None):
+                    issues.add('unknown_color', palette_index=i, color=color)
+        result['size'] = size
+        result['codes'] = count
+    except (OSError, ValueError) as e:
+        result['error'] = f'{type(e).__name__}: {e}'
+    result['ok'] = not issues.counts and 'error' not in result
+    result['issues'] = dict(issues.counts)
+    result['samples'] = issues.samples
+    result['seconds'] = round(time.perf_counter() - start, 6)
+    return result
+
+
+def validate_paths(patterns, workers=None, max_samples=20):
+    """Validate every file matched by `patterns`; returns the report dict."""
+    paths = expand_inputs(patterns, VALIDATE_EXTS)
+    start = time.perf_counter()
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers <= 1 or len(paths) <= 1:
+        files = [validate_file(p, max_samples) for p in paths]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(validate_file, p, max_samples) for p in paths]
+            files = [fut.result() for fut in as_completed(futures)]
+        order = {p: i for i, p in enumerate(paths)}
+        files.sort(key=lambda r: order[r['path']])
+
+    totals = Counter()
+    for r in files:
+        totals.update(r['issues'])
+    failed = sum(1 for r in files if not r['ok'])
+    return {
+        'summary': {
+            'files': len(files),
+            'ok': len(files) - failed,
+            'failed': failed,
+            'codes': sum(r['codes'] for r in files),
+            'issues': {kind: totals[kind] for kind in ISSUE_TYPES if totals[kind]},
+            'seconds': round(time.perf_counter() - start, 6),
+        },
+        'files': files,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Validate pixel-code files in bulk')
+    parser.add_argument('inputs', nargs='+', help='Files, directories or glob patterns')
+    parser.add_argument('--workers', '-j', type=int, help='Worker processes (default: CPU count)')
+    parser.add_argument('--report', help='Write the full JSON report here')
+    parser.add_argument('--max-samples', type=int, default=20, help='Issue examples kept per file (default 20)')
+    parser.add_argument('--quiet', '-q', action='store_true', help='Only print failing files and the summary')
+    args = parser.parse_args()
+
+    report = validate_paths(args.inputs, args.workers, args.max_samples)
+    for r in report['files']:
+        if r['ok']:
+            if not args.quiet:
+                print(f"OK   {r['path']} ({r['codes']} codes)")
+            continue
+        detail = r.get('error') or ', '.join(f'{kind} {n}' for kind, n in r['issues'].items())
+        print(f"FAIL {r['path']}: {detail}")
+    s = report['summary']
+    print(f"{s['ok']}/{s['files']} files valid, {s['codes']} codes checked in {s['seconds']:.3f}s")
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f'Wrote report: {args.report}')
+    if s['failed']:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
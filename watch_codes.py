@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+watch_codes.py
+
+Watch image folders and keep their pixel-code JSON (and `codes.json`) up to
+date. Polling only: every --interval seconds the inputs are stat'ed; a file
+whose mtime or size changed is re-encoded once it has been quiet for
+--debounce seconds and its SHA-256 really differs (touching or re-saving
+identical bytes is ignored). Changed files are encoded on a process pool
+with the same worker as `--batch` mode.
+
+When the re-encoded output is the pixel-code JSON behind `codes.json`
+(--codes-source, default `as_pixels_codes_32x32.json`), only the keys for
+rows that changed are rewritten (see `generate_codes_json.update_codes_map`)
+instead of regenerating the whole file; with --index the reverse-lookup
+index (`codes_index.py`) is updated for the same keys.
+
+Outputs are laid out like `--batch` mode (`batch_convert.plan_outputs`):
+each image keeps its directory relative to the watched images' common
+directory, and an image whose output would clash with another's is
+reported and skipped.
+
+On start, images whose JSON is missing or older than the image are encoded.
+
+Usage:
+  py -3 watch_codes.py sprites/ "more/*.png" --output-dir codes --workers 4
+  py -3 watch_codes.py as.png --once
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from batch_convert import IMAGE_EXTS, _convert_one, expand_inputs, plan_outputs
+from codes_index import INDEX_PATH
+from codes_map import write_codes
+from generate_codes_json import (INPUT as CODES_SOURCE, OUTPUT as CODES_JSON, build_codes_map, rows_from_codes_map,
+                                 update_codes_map)
+
+
+def file_digest(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 16), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _stat_key(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def _same_path(a, b):
+    return os.path.normcase(os.path.abspath(a)) == os.path.normcase(os.path.abspath(b))
+
+
+def _load_rows(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f).get('rows', {})
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+class Watcher:
+    """Polling state for one set of watched inputs.
+
+    `known` maps each image to the (mtime_ns, size, sha256) last encoded
+    (or seen at start); `pending` maps changed images to the time their
+    stat last changed, for debouncing; `staged` holds the state of images
+    handed to `encode` until the encode succeeds. `outputs` is the
+    current `batch_convert.plan_outputs` layout, so outputs keep their
+    subdirectory exactly as in `--batch` mode.
+    """
+
+    def __init__(self, patterns, output_dir=None, debounce=0.5,
+                 codes_source=CODES_SOURCE, codes_path=CODES_JSON, index_path=None, **options):
+        self.patterns = patterns
+        self.output_dir = output_dir
+        self.debounce = debounce
+        self.codes_source = codes_source
+        self.codes_path = codes_path
+        self.index_path = index_path
+        self.options = options
+        self.known = {}
+        self.seen = {}
+        self.pending = {}
+        self.staged = {}
+        self.outputs = {}
+        self.source_rows = _load_rows(codes_source)
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+
+    def output_for(self, path):
+        """Planned output path of `path`, or None if it clashes with another input."""
+        if path not in self.outputs:
+            self.outputs.update(plan_outputs('image_to_codes', [path], self.output_dir, **self.options))
+        return self.outputs[path]
+
+    def plan(self, paths):
+        """Lay out the outputs of `paths`; returns the paths that have one.
+
+        Inputs whose output would clash with an earlier input's are reported
+        once and left unwatched; inputs whose output moved (e.g. a new
+        directory changed the common root) are treated as newly seen.
+        """
+        old = self.outputs
+        self.outputs = plan_outputs('image_to_codes', paths, self.output_dir, **self.options)
+        for path, output in self.outputs.items():
+            if output is None:
+                if path not in old or old[path] is not None:
+                    print(f'{path} ERROR Output name clashes with an earlier input; not watched')
+            elif path in old and old[path] != output:
+                self.known.pop(path, None)
+                self.seen.pop(path, None)
+        return [path for path in paths if self.outputs[path] is not None]
+
+    def scan(self, now=None):
+        """Stat every input and record changes; returns the paths ready to encode."""
+        now = time.monotonic() if now is None else now
+        paths = self.plan(expand_inputs(self.patterns, IMAGE_EXTS))
+        for path in paths:
+            st = _stat_key(path)
+            if st is None:
+                continue
+            if path not in self.known:
+                # first sight: stale or missing output means it needs encoding
+                out = _stat_key(self.output_for(path))
+                if out is None or out[0] < st[0]:
+                    self.known[path] = (None, None, None)
+                else:
+                    self.known[path] = st + (file_digest(path),)
+            if self.seen.get(path) != st:
+                self.seen[path] = st
+                if st != self.known[path][:2]:
+                    self.pending[path] = now
+        for path in list(self.known):
+            if path not in paths:
+                self.known.pop(path)
+                self.seen.pop(path, None)
+                self.pending.pop(path, None)
+                self.staged.pop(path, None)
+
+        ready = []
+        for path, changed_at in list(self.pending.items()):
+            if now - changed_at < self.debounce:
+                continue
+            del self.pending[path]
+            st = self.seen[path]
+            try:
+                digest = file_digest(path)
+            except FileNotFoundError:
+                continue
+            if digest != self.known[path][2]:
+                ready.append(path)
+                self.staged[path] = st + (digest,)
+            else:
+                self.known[path] = st + (digest,)
+        return ready
+
+    def encode(self, paths, pool=None):
+        """Encode `paths`; returns the result dicts from the batch worker.
+
+        A file counts as encoded (`known`) only once its encode succeeded;
+        a failed file is picked up again on the next scan.
+        """
+        if pool is None or len(paths) <= 1:
+            results = [_convert_one('image_to_codes', path, self.output_for(path), self.options) for path in paths]
+        else:
+            futures = [pool.submit(_convert_one, 'image_to_codes', path, self.output_for(path), self.options)
+                       for path in paths]
+            results = [fut.result() for fut in futures]
+        for result in results:
+            path = result['input']
+            state = self.staged.pop(path, None)
+            if result['error'] is None:
+                if state is not None:
+                    self.known[path] = state
+            else:
+                # forget the stat so the next scan queues it again
+                self.seen.pop(path, None)
+        return results
+
+    def update_codes(self):
+        """Bring `codes.json` in line with the re-encoded codes source.
+
+        Returns the updated keys, or None if there was nothing to do. An
+        existing `codes.json` is always patched, never rebuilt, so remapped
+        key names survive; without the previous source rows (the source was
+        missing at start) the rows are recovered from the map itself.
+        """
+        new_rows = _load_rows(self.codes_source)
+        if new_rows is None:
+            return None
+        old_rows, self.source_rows = self.source_rows, new_rows
+        if os.path.exists(self.codes_path):
+            with open(self.codes_path, 'r', encoding='utf-8') as f:
+                codes_map = json.load(f)
+            if old_rows is None:
+                print(f'{self.codes_source} was not readable at start; diffing against {self.codes_path}')
+                old_rows = rows_from_codes_map(codes_map)
+            keys = update_codes_map(codes_map, old_rows, new_rows)
+            if not keys:
+                return []
+        else:
+            codes_map = build_codes_map(new_rows)
+            keys = list(codes_map)
+        write_codes(self.codes_path, codes_map)
+        if self.index_path:
+            from codes_index import update_index
+            update_index(self.index_path, codes_map)
+        return keys
+
+    def step(self, pool=None, now=None):
+        """One poll: scan, encode what is ready, update codes.json. Returns results."""
+        ready = self.scan(now)
+        if not ready:
+            return []
+        start = time.perf_counter()
+        results = self.encode(ready, pool)
+        for result in results:
+            status = f"-> {result['output']}" if result['error'] is None else f"ERROR {result['error']}"
+            print(f"{result['input']} {status} ({result['seconds']:.3f}s)")
+        if any(r['error'] is None and _same_path(r['output'], self.codes_source) for r in results):
+            t = time.perf_counter()
+            keys = self.update_codes()
+            if keys:
+                print(f'Updated {len(keys)} keys in {self.codes_path} ({(time.perf_counter() - t) * 1000:.1f} ms)')
+        print(f'Re-encoded {len(results)} file(s) in {time.perf_counter() - start:.3f}s')
+        return results
+
+
+def watch(patterns, interval=1.0, once=False, workers=None, **kwargs):
+    """Poll `patterns` until interrupted (or for one pass with `once`)."""
+    watcher = Watcher(patterns, **kwargs)
+    workers = workers or os.cpu_count() or 1
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        if once:
+            # one pass, no debounce wait
+            watcher.debounce = 0
+            return watcher.step(pool)
+        print(f"Watching {', '.join(patterns)} every {interval}s (Ctrl+C to stop)")
+        while True:
+            watcher.step(pool)
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        print('Stopped.')
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Re-encode changed images and update codes.json incrementally')
+    parser.add_argument('inputs', nargs='+', help='Image files, directories or glob patterns to watch')
+    parser.add_argument('--size', '-s', type=int, default=32, help='Target width/height (default 32)')
+    parser.add_argument('--no-resize', dest='resize', action='store_false', help='Do not resize input images')
+    parser.add_argument('--rle', action='store_true', help='Write span codes')
+    parser.add_argument('--palette', action='store_true', help='Write palette-indexed codes')
+    parser.add_argument('--output-dir', help='Directory for pixel-code JSON (default: current directory)')
+    parser.add_argument('--interval', type=float, default=1.0, help='Seconds between polls (default 1)')
+    parser.add_argument('--debounce', type=float, default=0.5, help='Seconds a file must be unchanged before encoding (default 0.5)')
+    parser.add_argument('--workers', '-j', type=int, help='Encoder worker processes (default: CPU count)')
+    parser.add_argument('--codes-source', default=CODES_SOURCE, help=f'Pixel-code JSON behind codes.json (default {CODES_SOURCE})')
+    parser.add_argument('--codes', default=CODES_JSON, help=f'codes.json to update (default {CODES_JSON})')
+    parser.add_argument('--index', nargs='?', const=INDEX_PATH, metavar='PATH', help=f'Also update the reverse-lookup index (default {INDEX_PATH})')
+    parser.add_argument('--once', action='store_true', help='Run a single pass and exit')
+    args = parser.parse_args()
+
+    watch(args.inputs, interval=args.interval, once=args.once, workers=args.workers,
+          output_dir=args.output_dir, debounce=args.debounce,
+          codes_source=args.codes_source, codes_path=args.codes, index_path=args.index,
+          size=args.size, resize=args.resize, rle=args.rle, palette=args.palette)
+
+
+if __name__ == '__main__':
+    main()